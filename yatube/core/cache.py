@@ -0,0 +1,322 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections
+from django.test.utils import override_settings
+
+from . import metrics
+
+
+STAMP_PREFIX = 'tiered_stamp:'
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """Кеш процесса (L1, LRU) перед общим кешем (L2).
+
+    L2 задается алиасом из settings.CACHES в OPTIONS['L2'], например
+    FileBasedCache, общий для всех воркеров. Запись идет в оба уровня
+    и меняет в L2 метку записанного ключа. Запись L1 сверяет свою
+    метку с L2 не чаще раза в OPTIONS['CHECK_INTERVAL'] секунд
+    и удаляется, если ключ переписал другой воркер: чужая запись
+    сбрасывает только свой ключ, а не весь L1. Прочитанное из L2
+    хранится в L1 не дольше OPTIONS['L1_TIMEOUT'] секунд.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self._interval = options.get('CHECK_INTERVAL', 1)
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _stamp_key(self, key):
+        return f'{STAMP_PREFIX}{key}'
+
+    def _stamp(self, keys, version):
+        """Новые метки ключей в L2 и для записей L1 этого воркера.
+
+        Метка живет L1_TIMEOUT: записи L1 старше нее не бывает.
+        """
+        stamps = {key: uuid4().hex for key in keys}
+        self.l2.set_many(
+            {self._stamp_key(key): stamp for key, stamp in stamps.items()},
+            self._l1_timeout, version=version,
+        )
+        return stamps
+
+    def _l1_get(self, key, version):
+        l1_key = self.make_key(key, version=version)
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is None:
+                return None
+            pickled, expires_at, stamp, checked_at = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                del self._l1[l1_key]
+                return None
+            self._l1.move_to_end(l1_key)
+        if now - checked_at < self._interval:
+            return pickled
+        if self.l2.get(self._stamp_key(key), version=version) != stamp:
+            self._l1_delete(key, version)
+            return None
+        with self._lock:
+            if l1_key in self._l1:
+                self._l1[l1_key] = (pickled, expires_at, stamp, now)
+        return pickled
+
+    def _l1_set(self, key, value, timeout, stamp, version):
+        if timeout is None or timeout > self._l1_timeout:
+            timeout = self._l1_timeout
+        now = time.monotonic()
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        l1_key = self.make_key(key, version=version)
+        with self._lock:
+            self._l1[l1_key] = (pickled, now + timeout, stamp, now)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key, version):
+        with self._lock:
+            self._l1.pop(self.make_key(key, version=version), None)
+
+    def get(self, key, default=None, version=None):
+        self.validate_key(self.make_key(key, version=version))
+        pickled = self._l1_get(key, version)
+        metrics.inc(
+            'yatube_cache_requests_total', cache='tiered_l1',
+            result='miss' if pickled is None else 'hit',
+        )
+        if pickled is not None:
+            return pickle.loads(pickled)
+        # Метка читается раньше значения: если ключ перепишут между
+        # чтениями, в L1 попадет новое значение со старой меткой
+        # и будет перечитано, но не наоборот.
+        stamp = self.l2.get(self._stamp_key(key), version=version)
+        value = self.l2.get(key, version=version)
+        metrics.inc(
+            'yatube_cache_requests_total', cache='tiered_l2',
+            result='miss' if value is None else 'hit',
+        )
+        if value is None:
+            return default
+        self._l1_set(key, value, self._l1_timeout, stamp, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.l2.set(key, value, timeout, version=version)
+        stamp = self._stamp([key], version)[key]
+        self._l1_set(key, value, timeout, stamp, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if not self.l2.add(key, value, timeout, version=version):
+            return False
+        stamp = self._stamp([key], version)[key]
+        self._l1_set(key, value, timeout, stamp, version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(key, version)
+        return self.l2.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.l2.delete(key, version=version)
+        self._stamp([key], version)
+        self._l1_delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        self._stamp([key], version)
+        self._l1_delete(key, version)
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.l2.set_many(data, timeout, version=version)
+        stamps = self._stamp(data, version)
+        for key, value in data.items():
+            self._l1_set(key, value, timeout, stamps[key], version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        self._stamp(keys, version)
+        for key in keys:
+            self._l1_delete(key, version)
+
+    def clear(self):
+        # Вместе с L2 пропадают и метки: записи L1 других воркеров
+        # с меткой сбрасываются при ближайшей сверке, остальные
+        # доживают свои L1_TIMEOUT.
+        self.l2.clear()
+        with self._lock:
+            self._l1.clear()
+
+
+@contextmanager
+def isolated_caches():
+    """Общий кеш того же бэкенда во временном каталоге.
+
+    Нагрузочные команды очищают и заполняют его, не трогая кеш
+    рабочего экземпляра, который читают все воркеры.
+    """
+    with tempfile.TemporaryDirectory() as location:
+        with override_settings(CACHES={
+            **settings.CACHES,
+            'shared': {**settings.CACHES['shared'], 'LOCATION': location},
+        }):
+            yield
+
+
+def _shared_backend(cache):
+    while isinstance(cache, TieredCache):
+        cache = cache.l2
+    return cache
+
+
+def acquire_lock(cache, key, timeout):
+    """Атомарно берет блокировку key в общем кеше на timeout секунд.
+
+    FileBasedCache.add проверяет файл и пишет его двумя шагами, и
+    блокировку могли бы взять несколько воркеров сразу, поэтому для него
+    блокировкой служит файл, созданный с O_EXCL. Остальным бэкендам
+    хватает add: у LocMemCache и Memcached он атомарен.
+    """
+    backend = _shared_backend(cache)
+    if not isinstance(backend, FileBasedCache):
+        return backend.add(key, True, timeout)
+    path = f'{backend._key_to_file(key)}.lock'
+    os.makedirs(backend._dir, exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        # Блокировку упавшего воркера снимает первый, кто ее встретит.
+        try:
+            if time.time() - os.path.getmtime(path) < timeout:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def release_lock(cache, key):
+    backend = _shared_backend(cache)
+    if not isinstance(backend, FileBasedCache):
+        backend.delete(key)
+        return
+    try:
+        os.remove(f'{backend._key_to_file(key)}.lock')
+    except FileNotFoundError:
+        pass
+
+
+def _track(key, result, on_stale=None):
+    metrics.inc(
+        'yatube_cache_requests_total',
+        cache=key.split('.')[0], result=result,
+    )
+    if on_stale is not None:
+        on_stale()
+
+
+def get_or_recompute(key, compute, timeout, version=None, stale_timeout=None,
+                     cacheable=None, background=False, lock_timeout=30,
+                     lock_wait=5, cache=None, on_stale=None):
+    """Значение из кеша; устаревшее отдается, пока его пересчитывают.
+
+    Запись хранит версию и срок свежести. Если версия сменилась или срок
+    вышел, пересчет берет на себя один запрос (или фоновый поток при
+    background=True), остальные получают старое значение. Когда записи
+    нет совсем, остальные ждут результат до lock_wait секунд.
+    cacheable решает, можно ли сохранить результат compute,
+    on_stale вызывается, когда отдается устаревшее значение.
+    Обращения считаются в метрике кеша по префиксу key до точки.
+    """
+    cache = cache or caches['default']
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+    lock_key = f'{key}.lock'
+
+    def recompute():
+        try:
+            value = compute()
+            if cacheable is None or cacheable(value):
+                cache.set(
+                    key,
+                    (version, time.time() + timeout, value),
+                    timeout + stale_timeout,
+                )
+            return value
+        finally:
+            release_lock(cache, lock_key)
+
+    entry = cache.get(key)
+    if entry is None:
+        if acquire_lock(cache, lock_key, lock_timeout):
+            _track(key, 'miss')
+            return recompute()
+        value = _wait_for_entry(cache, key, version, lock_wait)
+        _track(key, 'miss' if value is _MISSING else 'hit')
+        return compute() if value is _MISSING else value
+    entry_version, fresh_until, value = entry
+    if entry_version == version and fresh_until > time.time():
+        _track(key, 'hit')
+        return value
+    if not acquire_lock(cache, lock_key, lock_timeout):
+        _track(key, 'stale', on_stale)
+        return value
+    if not background:
+        _track(key, 'miss')
+        return recompute()
+    threading.Thread(
+        target=_recompute_in_thread, args=(recompute,), daemon=True
+    ).start()
+    _track(key, 'stale', on_stale)
+    return value
+
+
+def _wait_for_entry(cache, key, version, lock_wait):
+    deadline = time.monotonic() + lock_wait
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[2]
+    return _MISSING
+
+
+def _recompute_in_thread(recompute):
+    try:
+        recompute()
+    finally:
+        connections.close_all()
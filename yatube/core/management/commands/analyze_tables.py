@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет статистику таблиц (ANALYZE), по которой админка '
+        'оценивает число строк больших списков'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(
+                f'ANALYZE не поддерживается: {connection.vendor}'
+            )
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write('Статистика таблиц обновлена')
@@ -0,0 +1,259 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+# Метрики копятся в памяти процесса, фоновый поток раз
+# в METRICS_FLUSH_SECONDS записывает их целиком в файл процесса
+# METRICS_DIR/<pid>-<время запуска>.json: процесс с повторно выданным
+# pid не затрет файл остановленного. Страница /metrics складывает файлы
+# всех воркеров, а файлы, не обновлявшиеся METRICS_STALE_SECONDS,
+# прибавляет к archive.json и удаляет, чтобы суммы не уменьшались.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'Ответы по представлениям, методам и статусам'
+    ),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа представления'
+    ),
+    'yatube_db_queries_total': ('counter', 'Запросы к базе'),
+    'yatube_db_query_seconds_total': ('counter', 'Время запросов к базе'),
+    'yatube_db_rows_written_total': (
+        'counter', 'Строки, добавленные, измененные или удаленные'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу: hit, stale (отдано устаревшее), miss'
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Время создания миниатюр поста'
+    ),
+    'yatube_thumbnail_errors_total': (
+        'counter', 'Посты, для которых не удалось создать миниатюры'
+    ),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_flusher_pid = None
+_file_name = None
+PROCESS_FILE = re.compile(r'^\d+-\d+\.json$')
+ARCHIVE = 'archive.json'
+ARCHIVE_LOCK = 'archive.lock'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _start_flusher():
+    """Запускает поток записи в каждом процессе, в том числе
+    в воркерах, созданных fork после загрузки приложения.
+    """
+    global _flusher_pid, _file_name
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        _file_name = f'{_flusher_pid}-{time.time_ns() // 1000}.json'
+    threading.Thread(
+        target=_flush_forever, name='metrics', daemon=True
+    ).start()
+
+
+def _reset():
+    """Процесс, созданный fork, начинает с пустых метрик: иначе
+    значения родителя попали бы в сумму дважды.
+    """
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            logger.exception('Не удалось записать метрики')
+
+
+def inc(name, value=1, **labels):
+    if _flusher_pid != os.getpid():
+        _start_flusher()
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    """Добавляет значение в гистограмму с корзинами BUCKETS."""
+    if _flusher_pid != os.getpid():
+        _start_flusher()
+    with _lock:
+        histogram = _histograms.setdefault(
+            _key(name, labels), [0] * len(BUCKETS) + [0.0, 0]
+        )
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def _snapshot(counters, histograms):
+    return {
+        'counters': [
+            [name, dict(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, dict(labels), values]
+            for (name, labels), values in histograms.items()
+        ],
+    }
+
+
+def _write(path, snapshot):
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as stream:
+        json.dump(snapshot, stream)
+    os.replace(temporary, path)
+
+
+def _read(path, counters, histograms):
+    """Прибавляет метрики файла к counters и histograms."""
+    try:
+        with open(path, encoding='utf-8') as stream:
+            snapshot = json.load(stream)
+    except (FileNotFoundError, ValueError):
+        return
+    for name, labels, value in snapshot['counters']:
+        counters[_key(name, labels)] += value
+    for name, labels, values in snapshot['histograms']:
+        total = histograms.setdefault(_key(name, labels), [0] * len(values))
+        for index, value in enumerate(values):
+            total[index] += value
+
+
+def flush():
+    """Записывает метрики процесса в его файл в METRICS_DIR."""
+    with _lock:
+        if not _counters and not _histograms:
+            return
+        snapshot = _snapshot(_counters, _histograms)
+        file_name = _file_name
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    _write(os.path.join(settings.METRICS_DIR, file_name), snapshot)
+
+
+def _stale(path, deadline):
+    try:
+        return os.path.getmtime(path) < deadline
+    except FileNotFoundError:
+        return False
+
+
+def archive_stale():
+    """Переносит в archive.json файлы процессов, которые не обновлялись
+    METRICS_STALE_SECONDS, то есть остановлены. Архив меняет только
+    процесс, создавший archive.lock.
+    """
+    directory = settings.METRICS_DIR
+    deadline = time.time() - settings.METRICS_STALE_SECONDS
+    stale = [
+        file_name for file_name in os.listdir(directory)
+        if PROCESS_FILE.match(file_name)
+        and _stale(os.path.join(directory, file_name), deadline)
+    ]
+    if not stale:
+        return
+    lock = os.path.join(directory, ARCHIVE_LOCK)
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        # Блокировка упавшего процесса снимается по тому же сроку.
+        if _stale(lock, deadline):
+            os.remove(lock)
+        return
+    try:
+        counters, histograms = defaultdict(float), {}
+        for file_name in [ARCHIVE, *stale]:
+            _read(os.path.join(directory, file_name), counters, histograms)
+        _write(
+            os.path.join(directory, ARCHIVE),
+            _snapshot(counters, histograms),
+        )
+        for file_name in stale:
+            os.remove(os.path.join(directory, file_name))
+    finally:
+        os.remove(lock)
+
+
+def collect():
+    """Сумма метрик всех процессов: счетчики и гистограммы."""
+    counters, histograms = defaultdict(float), {}
+    try:
+        archive_stale()
+    except FileNotFoundError:
+        return counters, histograms
+    for file_name in os.listdir(settings.METRICS_DIR):
+        if file_name == ARCHIVE or PROCESS_FILE.match(file_name):
+            _read(
+                os.path.join(settings.METRICS_DIR, file_name),
+                counters, histograms,
+            )
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"'
+    ).replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def render():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    counters, histograms = collect()
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), values in sorted(histograms.items()):
+        *buckets, total, count = values
+        for bound, value in zip(BUCKETS, buckets):
+            series[name].append(
+                f'{name}_bucket{_labels(labels, le=bound)} {value}'
+            )
+        series[name] += [
+            f'{name}_bucket{_labels(labels, le="+Inf")} {count}',
+            f'{name}_sum{_labels(labels)} {total}',
+            f'{name}_count{_labels(labels)} {count}',
+        ]
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        lines += series.get(name, [])
+    return '\n'.join(lines) + '\n'
+
+
+atexit.register(flush)
+os.register_at_fork(after_in_child=_reset)
@@ -0,0 +1,218 @@
+import cProfile
+import logging
+import random
+import threading
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils import timezone
+
+from . import metrics
+from .profiles import QueryLog, save_capture
+
+
+logger = logging.getLogger('yatube.slow')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+_local = threading.local()
+
+
+class RequestStats:
+    """Время и число запросов к БД, время рендера шаблонов."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.slow_queries = []
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if duration * 1000 >= settings.SLOW_QUERY_MS:
+                self.slow_queries.append((duration, sql))
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        stats = current_stats()
+        if stats is None:
+            return render(self, context, request)
+        start = perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_time += perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """Заголовок Server-Timing и журнал медленных запросов.
+
+    Подключается настройкой PROFILING_ENABLED, без нее исключается
+    из цепочки middleware при старте.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        total = perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} SQL"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        self.log_slow(request, stats, total)
+        return response
+
+    def log_slow(self, request, stats, total):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                '%s %s %.1fms db=%.1fms/%d tpl=%.1fms',
+                view_name, request.get_full_path(), total * 1000,
+                stats.db_time * 1000, stats.queries,
+                stats.template_time * 1000,
+            )
+        for duration, sql in stats.slow_queries:
+            logger.warning('%s SQL %.1fms %s', view_name, duration * 1000, sql)
+
+
+class CaptureProfileMiddleware:
+    """Снимок cProfile отдельного запроса по требованию.
+
+    Профилируются запросы сотрудников с заголовком X-Profile или
+    параметром ?_profile, а также случайная доля
+    PROFILE_SAMPLE_RATE всех запросов. Дамп и сводка по SQL
+    сохраняются в PROFILE_CAPTURE_DIR и видны на странице
+    core:profiles. Стоит после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def wanted(self, request):
+        if random.random() < settings.PROFILE_SAMPLE_RATE:
+            return True
+        asked = (
+            'HTTP_X_PROFILE' in request.META or '_profile' in request.GET
+        )
+        return asked and request.user.is_staff
+
+    def __call__(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+        profiler, queries = cProfile.Profile(), QueryLog()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(queries.record_query)
+                )
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        match = request.resolver_match
+        response['X-Profile-Capture'] = save_capture(profiler, {
+            'url': request.get_full_path(),
+            'method': request.method,
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            'user': request.user.get_username(),
+            'duration_ms': round((perf_counter() - start) * 1000, 2),
+            'created': timezone.now().isoformat(),
+            'sql': queries.summary(),
+        })
+        return response
+
+
+class RequestMetrics(RequestStats):
+    """Статистика запроса и число строк, записанных в базу."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows_written = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        try:
+            return super().record_query(
+                execute, sql, params, many, context
+            )
+        finally:
+            if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+                self.rows_written += max(context['cursor'].rowcount, 0)
+
+
+class MetricsMiddleware:
+    """Счетчики и гистограммы для страницы /metrics.
+
+    По каждому представлению считает ответы, время ответа, запросы
+    к базе и записанные строки. Метрики процессов складываются через
+    общий каталог METRICS_DIR, см. core.metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestMetrics()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(stats.record_query)
+                )
+            response = self.get_response(request)
+        duration = perf_counter() - start
+        match = request.resolver_match
+        # Неизвестные адреса сводятся в одну метку, чтобы случайные
+        # пути не плодили новые ряды.
+        view = match.view_name if match else 'unresolved'
+        metrics.inc(
+            'yatube_http_requests_total', view=view,
+            method=request.method, status=response.status_code,
+        )
+        metrics.observe(
+            'yatube_http_request_duration_seconds', duration, view=view
+        )
+        metrics.inc('yatube_db_queries_total', stats.queries, view=view)
+        metrics.inc(
+            'yatube_db_query_seconds_total', stats.db_time, view=view
+        )
+        if stats.rows_written:
+            metrics.inc(
+                'yatube_db_rows_written_total', stats.rows_written, view=view
+            )
+        return response
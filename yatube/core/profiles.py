@@ -0,0 +1,102 @@
+import json
+import os
+import pstats
+import re
+import uuid
+from collections import defaultdict
+from time import perf_counter
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# Имя снимка: время записи и случайный суффикс, чтобы новые шли первыми
+# при обратной сортировке и имена не совпадали у параллельных воркеров.
+CAPTURE_NAME = re.compile(r'^\d{8}-\d{12}-[0-9a-f]{8}$')
+TOP_QUERIES = 5
+
+
+class QueryLog:
+    """Число запросов и время по каждому тексту SQL."""
+
+    def __init__(self):
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            statement = self.statements[sql]
+            statement[0] += 1
+            statement[1] += perf_counter() - start
+
+    def summary(self):
+        top = sorted(
+            self.statements.items(), key=lambda item: -item[1][1]
+        )[:TOP_QUERIES]
+        return {
+            'queries': sum(count for count, _ in self.statements.values()),
+            'db_ms': round(sum(
+                duration for _, duration in self.statements.values()
+            ) * 1000, 2),
+            'top': [
+                {'sql': sql, 'count': count, 'ms': round(duration * 1000, 2)}
+                for sql, (count, duration) in top
+            ],
+        }
+
+
+def capture_path(name, extension):
+    return os.path.join(settings.PROFILE_CAPTURE_DIR, f'{name}.{extension}')
+
+
+def save_capture(profiler, meta):
+    """Пишет дамп .prof и описание .json, старые снимки удаляет."""
+    os.makedirs(settings.PROFILE_CAPTURE_DIR, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+    profiler.dump_stats(capture_path(name, 'prof'))
+    with open(capture_path(name, 'json'), 'w', encoding='utf-8') as stream:
+        json.dump(meta, stream, ensure_ascii=False)
+    for old in capture_names()[settings.PROFILE_CAPTURE_KEEP:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(capture_path(old, extension))
+            except FileNotFoundError:
+                pass
+    return name
+
+
+def capture_names():
+    """Имена сохраненных снимков, новые первыми."""
+    try:
+        files = os.listdir(settings.PROFILE_CAPTURE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (
+            name for name, extension in map(os.path.splitext, files)
+            if extension == '.json' and CAPTURE_NAME.match(name)
+        ),
+        reverse=True,
+    )
+
+
+def load_capture(name, functions=0):
+    """Описание снимка и functions самых дорогих функций по cumtime."""
+    with open(capture_path(name, 'json'), encoding='utf-8') as stream:
+        capture = json.load(stream)
+    capture['name'] = name
+    if functions:
+        stats = pstats.Stats(capture_path(name, 'prof'))
+        stats.sort_stats('cumulative')
+        capture['functions'] = [
+            {
+                'function': pstats.func_std_string(function),
+                'calls': stats.stats[function][1],
+                'tottime_ms': round(stats.stats[function][2] * 1000, 2),
+                'cumtime_ms': round(stats.stats[function][3] * 1000, 2),
+            }
+            for function in stats.fcn_list[:functions]
+        ]
+    return capture
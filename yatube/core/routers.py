@@ -0,0 +1,86 @@
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Приложения, модели которых можно читать с реплик. Сессии и
+# пользователи всегда читаются с основной базы: вход и выход
+# видны сразу.
+REPLICA_APPS = {'posts'}
+_state = threading.local()
+
+
+class ReplicaRouter:
+    """Чтение с реплики, выбранной read_from_replica на запрос,
+    остальное — с основной базы default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            return getattr(_state, 'replica', None)
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def primary_reads():
+    """Временно читает с основной базы внутри read_from_replica."""
+    replica = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+def read_from_replica(view):
+    """Запросы представления читают с реплики, если пользователь
+    недавно ничего не записывал. Реплика выбирается одна на запрос:
+    реплики отстают по-разному, и страница не должна собираться
+    из их разных состояний.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                or PIN_COOKIE in request.COOKIES
+                or not settings.DATABASE_REPLICAS):
+            return view(request, *args, **kwargs)
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
+
+
+class PinPrimaryMiddleware:
+    """После записи оставляет пользователя на основной базе
+    на settings.REPLICA_PIN_SECONDS, пока реплики догоняют ее.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 содержимого.
+
+    Файл posts/photo.JPG с хешем abcd… сохраняется как
+    posts/ab/cd/abcd….jpg: каталоги не разрастаются,
+    а одинаковое содержимое хранится один раз.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
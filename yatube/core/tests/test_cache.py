@@ -0,0 +1,169 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import (TieredCache, acquire_lock, get_or_recompute,
+                     release_lock)
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-test',
+    },
+}
+
+
+def make_worker(max_entries=300):
+    return TieredCache('', {
+        'OPTIONS': {
+            'L2': 'shared',
+            'MAX_ENTRIES': max_entries,
+            'CHECK_INTERVAL': 0,
+        },
+    })
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_writes_go_through_to_shared_cache(self):
+        """Запись видна в L2 и у другого воркера."""
+        first, second = make_worker(), make_worker()
+        first.set('key', 'value')
+        self.assertEqual(caches['shared'].get('key'), 'value')
+        self.assertEqual(second.get('key'), 'value')
+
+    def test_foreign_write_resets_only_its_key(self):
+        """Запись другого воркера сбрасывает в L1 только свой ключ."""
+        first, second = make_worker(), make_worker()
+        first.set('key', 'old')
+        first.set('other', 'value')
+        self.assertEqual(second.get('key'), 'old')
+        self.assertEqual(second.get('other'), 'value')
+        first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'new')
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+        self.assertIn(second.make_key('other'), second._l1)
+        caches['shared'].set('other', 'changed behind L1')
+        self.assertEqual(second.get('other'), 'value')
+
+    def test_local_cache_is_bounded_lru(self):
+        """L1 хранит не больше MAX_ENTRIES последних ключей."""
+        worker = make_worker(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            worker.set(key, key)
+        self.assertEqual(list(worker._l1), [
+            worker.make_key('b'), worker.make_key('c')
+        ])
+        self.assertEqual(worker.get('a'), 'a')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GetOrRecomputeTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['shared']
+        self.cache.clear()
+        self.calls = []
+
+    def compute(self, value):
+        def compute():
+            self.calls.append(value)
+            return value
+        return compute
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение берется из кеша без пересчета."""
+        for _ in range(2):
+            value = get_or_recompute(
+                'key', self.compute('v1'), 60, version=1, cache=self.cache
+            )
+        self.assertEqual(value, 'v1')
+        self.assertEqual(self.calls, ['v1'])
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдается старое значение."""
+        get_or_recompute(
+            'key', self.compute('v1'), 60, version=1, cache=self.cache
+        )
+        self.cache.add('key.lock', True)
+        value = get_or_recompute(
+            'key', self.compute('v2'), 60, version=2, cache=self.cache
+        )
+        self.assertEqual(value, 'v1')
+        self.assertEqual(self.calls, ['v1'])
+        self.cache.delete('key.lock')
+        value = get_or_recompute(
+            'key', self.compute('v2'), 60, version=2, cache=self.cache
+        )
+        self.assertEqual(value, 'v2')
+
+    def test_not_cacheable_value_is_not_stored(self):
+        """Результат, отвергнутый cacheable, не сохраняется."""
+        get_or_recompute(
+            'key', self.compute(None), 60, cacheable=bool, cache=self.cache
+        )
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(self.cache.get('key.lock'))
+
+
+class FileLockTest(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        settings = override_settings(CACHES={
+            **TEST_CACHES,
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = caches['shared']
+
+    def test_lock_is_exclusive(self):
+        """Блокировку держит один владелец, устаревшая снимается."""
+        self.assertTrue(acquire_lock(self.cache, 'key.lock', 30))
+        self.assertFalse(acquire_lock(self.cache, 'key.lock', 30))
+        release_lock(self.cache, 'key.lock')
+        self.assertTrue(acquire_lock(self.cache, 'key.lock', 30))
+        self.assertTrue(acquire_lock(self.cache, 'key.lock', 0))
+
+    def test_concurrent_callers_compute_once(self):
+        """Одновременные запросы без записи в кеше считают значение
+        один раз, остальные дожидаются результата.
+        """
+        callers = 8
+        barrier = threading.Barrier(callers)
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        def call():
+            barrier.wait()
+            results.append(get_or_recompute(
+                'key', compute, 60, version=1, cache=self.cache
+            ))
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * callers)
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+
+User = get_user_model()
+
+
+def parse(text):
+    """Ряды метрик страницы /metrics: имя с метками -> значение."""
+    return {
+        series: float(value)
+        for series, value in (
+            line.rsplit(' ', 1) for line in text.splitlines()
+            if line and not line.startswith('#')
+        )
+    }
+
+
+class MetricsTest(TestCase):
+    SERIES = (
+        'yatube_http_requests_total'
+        '{method="GET",status="200",view="posts:index"}'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=metrics_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.metrics_dir = metrics_dir
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = Client().get(reverse('core:metrics'))
+        self.assertEqual(response.status_code, 200)
+        return parse(response.content.decode())
+
+    def test_views_db_and_cache(self):
+        """Ответы, время, запросы к базе, записанные строки
+        и обращения к кешу страниц считаются по представлениям.
+        """
+        before = self.scrape()
+        self.client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        after = self.scrape()
+
+        def delta(series):
+            return after.get(series, 0) - before.get(series, 0)
+
+        index = 'view="posts:index"'
+        self.assertEqual(delta(
+            'yatube_http_requests_total'
+            f'{{method="GET",status="200",{index}}}'
+        ), 2)
+        self.assertEqual(delta(
+            f'yatube_http_request_duration_seconds_count{{{index}}}'
+        ), 2)
+        self.assertGreater(delta(f'yatube_db_queries_total{{{index}}}'), 0)
+        self.assertGreater(delta(
+            'yatube_db_rows_written_total{view="posts:post_create"}'
+        ), 0)
+        for result in ('hit', 'miss'):
+            with self.subTest(result=result):
+                self.assertEqual(delta(
+                    'yatube_cache_requests_total'
+                    f'{{cache="index_page",result="{result}"}}'
+                ), 1)
+
+    def process_file(self):
+        return os.path.join(self.metrics_dir, metrics._file_name)
+
+    def test_processes_are_summed(self):
+        """Файлы всех процессов в METRICS_DIR складываются."""
+        self.client.get(reverse('posts:index'))
+        own = self.scrape()[self.SERIES]
+        shutil.copy(
+            self.process_file(), os.path.join(self.metrics_dir, '1-1.json')
+        )
+        self.assertEqual(self.scrape()[self.SERIES], own * 2)
+
+    def test_stale_files_are_archived(self):
+        """Файлы остановленных процессов переносятся в архив
+        и удаляются, а суммы не уменьшаются.
+        """
+        self.client.get(reverse('posts:index'))
+        own = self.scrape()[self.SERIES]
+        for total, name in enumerate(('1-1.json', '1-2.json'), start=2):
+            stale = os.path.join(self.metrics_dir, name)
+            shutil.copy(self.process_file(), stale)
+            os.utime(stale, (0, 0))
+            self.assertEqual(self.scrape()[self.SERIES], own * total)
+            self.assertFalse(os.path.exists(stale))
+        self.assertEqual(set(os.listdir(self.metrics_dir)), {
+            'archive.json', metrics._file_name,
+        })
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_access_is_restricted(self):
+        """Чужим адресам страница отдается только с токеном."""
+        url = reverse('core:metrics')
+        remote = Client(REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(remote.get(url).status_code, 403)
+        self.assertEqual(remote.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong'
+        ).status_code, 403)
+        self.assertEqual(remote.get(
+            url, HTTP_AUTHORIZATION='Bearer secret'
+        ).status_code, 200)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(remote.get(
+                url, HTTP_AUTHORIZATION='Bearer '
+            ).status_code, 403)
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from ..profiles import capture_names
+
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @override_settings(PROFILING_ENABLED=True, SLOW_REQUEST_MS=0)
+    def test_server_timing_and_slow_log(self):
+        """Профилирование добавляет Server-Timing и пишет медленные
+        запросы в журнал с именем представления.
+        """
+        with self.assertLogs('yatube.slow', level='WARNING') as logs:
+            response = Client().get(reverse('about:author'))
+        self.assertIn('Server-Timing', response)
+        for metric in ('db;dur=', 'tpl;dur=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, response['Server-Timing'])
+        self.assertIn('about:author', logs.output[0])
+
+    def test_disabled_by_default(self):
+        """Без PROFILING_ENABLED middleware не подключается."""
+        response = Client().get(reverse('about:author'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class CaptureProfileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        capture_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, capture_dir)
+        settings = override_settings(PROFILE_CAPTURE_DIR=capture_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_staff_capture_listed(self):
+        """Запрос сотрудника с X-Profile сохраняется и виден
+        на странице снимков с функциями и сводкой SQL.
+        """
+        url = reverse('posts:index')
+        response = self.staff_client.get(url, HTTP_X_PROFILE='1')
+        name = response['X-Profile-Capture']
+        self.assertEqual(capture_names(), [name])
+        response = self.staff_client.get(reverse('core:profiles'))
+        capture = response.context['captures'][0]
+        self.assertEqual(capture['url'], url)
+        self.assertEqual(capture['view'], 'posts:index')
+        self.assertGreater(capture['sql']['queries'], 0)
+        self.assertTrue(capture['functions'])
+        response = self.staff_client.get(
+            reverse('core:profile_download', args=[name])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_staff_can_ask(self):
+        """Флаг от обычного пользователя игнорируется,
+        страница снимков доступна только сотрудникам.
+        """
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertNotIn('X-Profile-Capture', response)
+        self.assertEqual(capture_names(), [])
+        response = client.get(reverse('core:profiles'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_CAPTURE_KEEP=2)
+    def test_sampling_keeps_recent(self):
+        """Выборочные снимки снимаются без флага, старые удаляются."""
+        for _ in range(3):
+            Client().get(reverse('about:author'))
+        self.assertEqual(len(capture_names()), 2)
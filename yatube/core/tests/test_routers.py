@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from ..routers import (PIN_COOKIE, ReplicaRouter, primary_reads,
+                       read_from_replica)
+
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='test-text', author=cls.user)
+
+    def route(self, request, model):
+        router = ReplicaRouter()
+        routes = {}
+
+        @read_from_replica
+        def view(request):
+            routes['view'] = router.db_for_read(model)
+            with primary_reads():
+                routes['primary'] = router.db_for_read(model)
+
+        view(request)
+        routes['outside'] = router.db_for_read(model)
+        return routes
+
+    def test_feed_reads_go_to_replica(self):
+        """Посты в представлениях лент читаются с реплики,
+        пользователи и все вне лент — с основной базы.
+        """
+        request = RequestFactory().get('/')
+        self.assertEqual(self.route(request, Post), {
+            'view': 'replica1', 'primary': None, 'outside': None,
+        })
+        self.assertIsNone(self.route(request, User)['view'])
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_request_reads_one_replica(self):
+        """Все чтения запроса идут на одну и ту же реплику."""
+        router = ReplicaRouter()
+
+        @read_from_replica
+        def view(request):
+            return {router.db_for_read(Post) for _ in range(20)}
+
+        for _ in range(10):
+            replicas = view(RequestFactory().get('/'))
+            self.assertEqual(len(replicas), 1)
+            self.assertIn(replicas.pop(), ['replica1', 'replica2'])
+
+    def test_pinned_user_reads_primary(self):
+        """После записи пользователь читает с основной базы."""
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertIsNone(self.route(request, Post)['view'])
+
+    def test_write_pins_user_to_primary(self):
+        """Записывающий POST ставит куку, GET — нет."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'comment'},
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
@@ -0,0 +1,37 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from ..storage import HashedFileSystemStorage
+
+
+class HashedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.storage = HashedFileSystemStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+    def test_name_is_sharded_content_hash(self):
+        """Имя файла — хеш содержимого в каталогах по первым байтам."""
+        name = self.storage.save('posts/photo.JPG', ContentFile(b'image'))
+        digest = (
+            '6105d6cc76af400325e94d588ce511be'
+            '5bfdbb73b437dc51eca43917d7a43e3d'
+        )
+        self.assertEqual(name, f'posts/61/05/{digest}.jpg')
+        self.assertTrue(self.storage.is_hashed(name))
+        self.assertFalse(self.storage.is_hashed('posts/photo.jpg'))
+
+    def test_same_content_stored_once(self):
+        """Одинаковое содержимое сохраняется в один файл."""
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(self.storage.open(first).read(), b'same')
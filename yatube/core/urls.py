@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = 'core'
+
+urlpatterns = [
+    path('metrics', views.metrics, name='metrics'),
+    path('profiles/', views.profile_list, name='profiles'),
+    path(
+        'profiles/<str:name>.prof',
+        views.profile_download,
+        name='profile_download'
+    ),
+]
@@ -1,5 +1,17 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as metrics_registry
+from .profiles import capture_names, capture_path, load_capture
+
+
+PROFILE_FUNCTIONS = 15
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +27,47 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def profile_list(request):
+    captures = []
+    for name in capture_names():
+        try:
+            captures.append(load_capture(name, functions=PROFILE_FUNCTIONS))
+        except FileNotFoundError:
+            # Снимок удалил другой воркер, пока страница собиралась.
+            continue
+    return render(request, 'core/profiles.html', {'captures': captures})
+
+
+@staff_member_required
+def profile_download(request, name):
+    if name not in capture_names():
+        raise Http404
+    return FileResponse(
+        open(capture_path(name, 'prof'), 'rb'),
+        as_attachment=True,
+        filename=f'{name}.prof',
+    )
+
+
+def metrics_allowed(request):
+    """Адрес из METRICS_ALLOWED_IPS или верный токен METRICS_TOKEN."""
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {token}'.encode(),
+    )
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    metrics_registry.flush()
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,8 +1,61 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
 from .models import Post, Group, Comment, Follow
+from .search import filter_by_search
+
+
+# До этого числа строк список в админке считается точно.
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimate_rows(queryset):
+    """Число строк таблицы по статистике ANALYZE или None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return int(row[0].split()[0]) if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Точное число строк до EXACT_COUNT_LIMIT, дальше — оценка.
+
+    COUNT(*) по большой таблице читает ее целиком, поэтому считаются
+    только первые EXACT_COUNT_LIMIT + 1 строк. Если их больше,
+    для списка без фильтров берется статистика ANALYZE (ее обновляет
+    analyze_tables), а без статистики и с фильтрами — точное число.
+    """
+
+    @cached_property
+    def count(self):
+        count = self.object_list[:EXACT_COUNT_LIMIT + 1].count()
+        if count <= EXACT_COUNT_LIMIT:
+            return count
+        if not self.object_list.query.where:
+            estimate = estimate_rows(self.object_list)
+            if estimate is not None:
+                return max(estimate, count)
+        return self.object_list.count()
+
 
+class FastChangeListMixin:
+    """Общие настройки списков больших таблиц."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-class PostAdmin(admin.ModelAdmin):
+
+class PostAdmin(FastChangeListMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,12 +64,44 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        return filter_by_search(queryset, search_term), False
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
+
+
+class CommentAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'text', 'pub_date', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
+    search_fields = ('text',)
+    date_hierarchy = 'pub_date'
+    ordering = ('-pub_date', '-id')
+
+
+class FollowAdmin(FastChangeListMixin, admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,198 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core.cache import get_or_recompute
+from core.routers import primary_reads
+
+from .models import Post
+
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Версия всех лент: меняется при переименовании групп и авторов,
+# которые показываются в карточках постов на любой странице.
+SITE_FEED = 'site'
+INDEX_FEED = 'index'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def profile_feed(username):
+    return f'profile:{username}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def post_feeds(post_id):
+    """Ленты страницы поста: сам пост и счетчик постов его автора."""
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return [post_feed(post_id), profile_feed(username)]
+
+
+def version_key(feed):
+    return f'feed_version:{feed}'
+
+
+def new_version():
+    """Версия ленты: время изменения и случайный суффикс."""
+    return f'{time.time():.6f}-{uuid4().hex[:8]}'
+
+
+def get_feed_versions(feeds):
+    keys = [version_key(feed) for feed in feeds]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_feeds(*feeds):
+    """Сбрасывает закешированные страницы перечисленных лент."""
+    cache.set_many({version_key(feed): new_version() for feed in feeds}, None)
+
+
+def request_versions(request, feeds, kwargs):
+    """Версии лент страницы, один раз на запрос."""
+    if not hasattr(request, '_feed_versions'):
+        request._feed_versions = get_feed_versions(
+            [SITE_FEED, *feeds(**kwargs)]
+        )
+    return request._feed_versions
+
+
+def versions_digest(versions):
+    return md5(':'.join(versions).encode()).hexdigest()[:12]
+
+
+def versions_changed_at(versions):
+    """Время последнего изменения лент, unix timestamp."""
+    return max(float(version.split('-')[0]) for version in versions)
+
+
+def is_cacheable(response):
+    return response.status_code == 200 and not response.cookies
+
+
+def cached_page(request, key_prefix, feeds, render, **kwargs):
+    """Ответ из кеша страниц; устаревший отдается, пока один запрос
+    рендерит страницу для новой версии лент.
+    """
+    path = f'{request.get_full_path()}:{request.user.pk or 0}'
+    versions = request_versions(request, feeds, kwargs)
+
+    def render_fresh():
+        # Реплики могут еще не получить изменение, сменившее версию:
+        # такую страницу рендерим с основной базы, иначе в кеш
+        # на новую версию попадет старое содержимое.
+        if time.time() - versions_changed_at(versions) < (
+            settings.REPLICA_PIN_SECONDS
+        ):
+            with primary_reads():
+                return render()
+        return render()
+
+    return get_or_recompute(
+        f'{key_prefix}.{md5(path.encode()).hexdigest()}',
+        render_fresh,
+        FEED_CACHE_TIMEOUT,
+        version=versions_digest(versions),
+        cacheable=is_cacheable,
+        on_stale=lambda: setattr(request, '_stale_page', True),
+    )
+
+
+def cache_feed(key_prefix, feeds):
+    """Кеширует страницу для каждого пользователя с учетом версий лент.
+
+    feeds получает аргументы представления из URL и возвращает
+    список лент, от которых зависит страница.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            return cached_page(
+                request, key_prefix, feeds,
+                lambda: view(request, *args, **kwargs), **kwargs
+            )
+        return wrapper
+    return decorator
+
+
+def cache_anonymous(key_prefix, feeds):
+    """Кеширует страницу целиком для неавторизованных посетителей.
+
+    Ключ строится из пути с параметрами запроса и версий лент страницы,
+    авторизованным пользователям страница всегда рендерится заново:
+    в ней есть CSRF-форма и персональная шапка.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            return cached_page(
+                request, key_prefix, feeds,
+                lambda: view(request, *args, **kwargs), **kwargs
+            )
+        return wrapper
+    return decorator
+
+
+def conditional_feed(feeds):
+    """Отвечает 304 Not Modified по версиям лент страницы, без рендера.
+
+    ETag учитывает пользователя, так как шапка страницы персональная,
+    Last-Modified — время последнего изменения лент. Браузеру
+    разрешено хранить страницу, только сверяясь с сервером.
+    """
+    def etag(request, *args, **kwargs):
+        versions = request_versions(request, feeds, kwargs)
+        if request.user.is_authenticated:
+            # В странице есть {% csrf_token %}: после нового входа
+            # секрет CSRF меняется, и сохраненная страница с прежним
+            # токеном не должна считаться актуальной. get_token
+            # создает секрет, если его еще нет, как сделал бы рендер.
+            get_token(request)
+            versions = [*versions, request.META['CSRF_COOKIE']]
+        return f'W/"{versions_digest(versions)}-{request.user.pk or 0}"'
+
+    def last_modified(request, *args, **kwargs):
+        stamp = versions_changed_at(request_versions(request, feeds, kwargs))
+        return datetime.fromtimestamp(stamp, tz=timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(request, '_stale_page', False):
+                # Устаревшая страница из кеша не соответствует версиям
+                # лент: с их ETag браузер хранил бы ее до следующего
+                # изменения, получая 304.
+                for header in ('ETag', 'Last-Modified'):
+                    if response.has_header(header):
+                        del response[header]
+            patch_cache_control(response, no_cache=True, max_age=0)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,76 @@
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+# Счетчик пользователя: (модель, поле модели, указывающее на пользователя).
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_user_stats(user_ids=None):
+    """Считает счетчики пользователей по таблицам: {user_id: {поле: n}}."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    stats = {
+        user_id: dict.fromkeys(USER_COUNTERS, 0)
+        for user_id in users.values_list('pk', flat=True)
+    }
+    for field, (model, user_field) in USER_COUNTERS.items():
+        rows = model.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(**{f'{user_field}__in': user_ids})
+        rows = rows.order_by().values(user_field).annotate(
+            total=Count('pk')
+        )
+        for row in rows:
+            stats[row[user_field]][field] = row['total']
+    return stats
+
+
+def count_group_posts():
+    """Считает посты групп по таблице постов: {group_id: n}."""
+    totals = dict.fromkeys(Group.objects.values_list('pk', flat=True), 0)
+    rows = Post.objects.filter(group__isnull=False).order_by().values(
+        'group'
+    ).annotate(total=Count('pk'))
+    for row in rows:
+        totals[row['group']] = row['total']
+    return totals
+
+
+def recount_user(user_id):
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=count_user_stats([user_id])[user_id]
+    )
+    return stats
+
+
+def get_user_stats(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def change_user_counter(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def change_group_counter(group_id, delta):
+    if group_id is None:
+        return
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    groups.update(posts_count=F('posts_count') + delta)
@@ -0,0 +1,134 @@
+import json
+import random
+import statistics
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import isolated_caches
+from posts.models import Group, Post, User
+
+
+# Запросы берутся из первых страниц лент: глубже почти не листают.
+PAGES = 3
+# Подписчики, от имени которых открывается лента подписок.
+FOLLOWERS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон лент: задержка p50/p95/p99 и число запросов '
+        'к базе для каждой страницы, результат в JSON. Кеш страниц '
+        'временный: общий кеш не очищается и не заполняется'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Число запросов к каждой странице',
+        )
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output',
+            help='Файл результата, по умолчанию стандартный вывод',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.clear = options['no_cache']
+        self.load_samples()
+        with isolated_caches():
+            results = {
+                name: self.measure(request, options['requests'])
+                for name, request in self.scenarios().items()
+            }
+        report = json.dumps({
+            'requests': options['requests'],
+            'cache': not self.clear,
+            'views': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output'] is None:
+            self.stdout.write(report)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(report + '\n')
+
+    def load_samples(self):
+        self.posts = list(Post.objects.values_list('pk', flat=True)[:1000])
+        if not self.posts:
+            raise CommandError(
+                'В базе нет постов, заполните ее командой seed_benchmark'
+            )
+        self.groups = list(Group.objects.values_list('slug', flat=True))
+        self.authors = list(User.objects.filter(
+            posts__isnull=False
+        ).distinct().values_list('username', flat=True)[:1000])
+        self.followers = []
+        for user in User.objects.filter(
+            follower__isnull=False
+        ).distinct()[:FOLLOWERS]:
+            client = Client()
+            client.force_login(user)
+            self.followers.append(client)
+
+    def page(self, url):
+        return f'{url}?page={self.random.randint(1, PAGES)}'
+
+    def scenarios(self):
+        """Страница -> функция, выдающая (клиент, адрес) запроса."""
+        anonymous = Client()
+        scenarios = {
+            'index': lambda: (
+                anonymous, self.page(reverse('posts:index'))
+            ),
+            'profile': lambda: (anonymous, self.page(reverse(
+                'posts:profile', args=[self.random.choice(self.authors)]
+            ))),
+            'post_detail': lambda: (anonymous, reverse(
+                'posts:post_detail', args=[self.random.choice(self.posts)]
+            )),
+        }
+        if self.groups:
+            scenarios['group_list'] = lambda: (anonymous, self.page(reverse(
+                'posts:group_list', args=[self.random.choice(self.groups)]
+            )))
+        if self.followers:
+            scenarios['follow_index'] = lambda: (
+                self.random.choice(self.followers),
+                self.page(reverse('posts:follow_index')),
+            )
+        return scenarios
+
+    def measure(self, request, total):
+        timings, queries = [], []
+        for _ in range(total):
+            client, url = request()
+            if self.clear:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                start = perf_counter()
+                response = client.get(url)
+                timings.append((perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries.append(len(context.captured_queries))
+        percentiles = (
+            statistics.quantiles(timings, n=100) if len(timings) > 1
+            else timings * 99
+        )
+        return {
+            'rps': round(total / sum(timings) * 1000, 1),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'queries': round(statistics.mean(queries), 1),
+        }
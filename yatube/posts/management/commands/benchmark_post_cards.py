@@ -0,0 +1,54 @@
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+
+from core.cache import isolated_caches
+from posts.models import Post
+from posts.utilities import POSTS_ON_PAGES
+
+
+FEED_TEMPLATE = (
+    '{% for post in posts %}{% include "includes/post.html" %}{% endfor %}'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендера карточек ленты без кеша и из кеша; '
+        'кеш временный, общий кеш не очищается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200)
+
+    def handle(self, *args, rounds, **options):
+        posts = list(
+            Post.objects.select_related('author', 'group')[:POSTS_ON_PAGES]
+        )
+        if len(posts) < POSTS_ON_PAGES:
+            raise CommandError(
+                f'Нужно хотя бы {POSTS_ON_PAGES} постов в базе'
+            )
+        template = engines['django'].from_string(FEED_TEMPLATE)
+        with isolated_caches():
+            cold = self.measure(template, posts, rounds, clear=True)
+            warm = self.measure(template, posts, rounds, clear=False)
+        self.stdout.write(
+            f'Страница из {len(posts)} постов, {rounds} повторов:\n'
+            f'  без кеша: {cold:.2f} мс\n'
+            f'  из кеша:  {warm:.2f} мс\n'
+            f'  ускорение: {cold / warm:.1f}x'
+        )
+
+    def measure(self, template, posts, rounds, clear):
+        template.render({'posts': posts})
+        total = 0
+        for _ in range(rounds):
+            if clear:
+                cache.clear()
+            start = perf_counter()
+            template.render({'posts': posts})
+            total += perf_counter() - start
+        return total / rounds * 1000
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+from core.cache import isolated_caches
+from posts.models import Comment, Post, User
+from posts.utilities import FEED_ORDERING, POSTS_ON_PAGES
+
+
+# Профиль SQLite по умолчанию: журнал отката, без ожидания блокировок.
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'busy_timeout': 0}
+
+
+def copy_database(source, target):
+    """Копия базы через backup API: shutil.copy рабочей базы в режиме
+    WAL потерял бы данные, еще не перенесенные из файла -wal.
+    """
+    source = sqlite3.connect(source)
+    try:
+        target = sqlite3.connect(target)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность ленты при одновременной '
+        'записи с прагмами SQLite по умолчанию и из настроек'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+
+    def handle(self, *args, seconds, readers, writers, **options):
+        settings_dict = connections['default'].settings_dict
+        original = dict(settings_dict)
+        # Записи бенчмарка вызывают сигналы постов: ленты сбрасываются
+        # во временном кеше, а не в общем кеше рабочего экземпляра.
+        try:
+            with isolated_caches():
+                self.compare(original['NAME'], seconds, readers, writers)
+        finally:
+            connections.close_all()
+            settings_dict.clear()
+            settings_dict.update(original)
+
+    def compare(self, source, seconds, readers, writers):
+        for title, pragmas in (
+            ('по умолчанию', DEFAULT_PRAGMAS),
+            ('из настроек', settings.SQLITE_PRAGMAS),
+        ):
+            with tempfile.TemporaryDirectory() as directory:
+                copy = os.path.join(directory, 'db.sqlite3')
+                copy_database(source, copy)
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    stats = self.run(copy, seconds, readers, writers)
+            self.stdout.write(
+                f'Прагмы {title}: лента {stats["reads"] / seconds:.0f}/с, '
+                f'записи {stats["writes"] / seconds:.0f}/с, '
+                f'ошибок блокировки {stats["locked"]}'
+            )
+
+    def run(self, name, seconds, readers, writers):
+        connections.close_all()
+        connections['default'].settings_dict['NAME'] = name
+        author = User.objects.get_or_create(username='benchmark')[0]
+        post = Post.objects.create(text='benchmark', author=author)
+        stats = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=self.loop, args=(
+                self.read_feed, stats, 'reads', lock, deadline
+            )) for _ in range(readers)
+        ] + [
+            threading.Thread(target=self.loop, args=(
+                lambda: self.write(author, post), stats, 'writes', lock,
+                deadline
+            )) for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        connections.close_all()
+        return stats
+
+    def loop(self, action, stats, counter, lock, deadline):
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    action()
+                except OperationalError:
+                    with lock:
+                        stats['locked'] += 1
+                    continue
+                with lock:
+                    stats[counter] += 1
+        finally:
+            connections.close_all()
+
+    def read_feed(self):
+        list(Post.objects.select_related('author', 'group').order_by(
+            *FEED_ORDERING
+        )[:POSTS_ON_PAGES])
+
+    @transaction.atomic
+    def write(self, author, post):
+        Comment.objects.create(post=post, author=author, text='benchmark')
+        Post.objects.filter(pk=post.pk).update(text='benchmark')
@@ -0,0 +1,140 @@
+import posixpath
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts.models import Post
+
+
+IMAGES_DIR = 'posts'
+
+
+def walk(storage, path):
+    """Файлы каталога хранилища и его подкаталогов, по одному."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+def batches(names, size):
+    names = iter(names)
+    while True:
+        batch = list(islice(names, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения, на которые не ссылается ни один пост, '
+        'и миниатюры, которых нет в хранилище ключей sorl'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько файлов сверять с БД за один запрос',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Не больше стольких удалений в секунду, 0 — без ограничения',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24,
+            help='Не трогать файлы моложе стольких часов',
+        )
+
+    def handle(self, *args, dry_run, batch_size, rate, min_age, **options):
+        self.dry_run = dry_run
+        self.delay = 1 / rate if rate else 0
+        self.cutoff = timezone.now() - timedelta(hours=min_age)
+        self.deleted = self.reclaimed = 0
+        self.collect_images(batch_size)
+        self.collect_thumbnails(batch_size)
+        action = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(
+            f'{action} файлов: {self.deleted}, '
+            f'освобождено: {self.reclaimed / 2 ** 20:.1f} МБ'
+        )
+
+    def old_files(self, storage, path):
+        if not storage.exists(path):
+            return
+        for name in walk(storage, path):
+            if storage.get_modified_time(name) < self.cutoff:
+                yield name
+
+    def collect_images(self, batch_size):
+        storage = Post._meta.get_field('image').storage
+        for batch in batches(self.old_files(storage, IMAGES_DIR), batch_size):
+            used = set(Post.objects.filter(
+                image__in=batch
+            ).values_list('image', flat=True))
+            for name in batch:
+                if name not in used:
+                    self.delete_image(storage, name)
+
+    def delete_image(self, storage, name):
+        source = ImageFile(name, storage)
+        thumbnail_keys = default.kvstore._get(
+            source.key, identity='thumbnails'
+        ) or []
+        for key in thumbnail_keys:
+            thumbnail = default.kvstore._get(key)
+            if thumbnail is not None and thumbnail.exists():
+                self.report(thumbnail.name, thumbnail.storage.size(
+                    thumbnail.name
+                ))
+        self.report(name, storage.size(name))
+        if not self.dry_run:
+            default.kvstore.delete(source)
+            storage.delete(name)
+            time.sleep(self.delay)
+
+    def collect_thumbnails(self, batch_size):
+        """Миниатюры без записи в хранилище ключей: их исходное
+        изображение удалено, и sorl их больше не выдаст.
+        """
+        storage = default.storage
+        prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for batch in batches(self.old_files(storage, prefix), batch_size):
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in batch
+            }
+            known = set(KVStore.objects.filter(
+                key__in=list(keys)
+            ).values_list('key', flat=True))
+            for key, name in keys.items():
+                if key not in known:
+                    self.report(name, storage.size(name))
+                    if not self.dry_run:
+                        storage.delete(name)
+                        time.sleep(self.delay)
+
+    def report(self, name, size):
+        self.deleted += 1
+        self.reclaimed += size
+        self.stdout.write(self.style.WARNING(f'{name}: {size} байт'))
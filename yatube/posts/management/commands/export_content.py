@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+CHUNK_SIZE = 2000
+# Записи выгрузки в порядке, в котором их можно загрузить:
+# тип -> (запрос, поля записи и соответствующие им поля запроса).
+EXPORTS = {
+    'group': (Group.objects.order_by('pk'), {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    'user': (User.objects.order_by('pk'), {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+    }),
+    'post': (Post.objects.order_by('pk'), {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comment': (Comment.objects.order_by('pk'), {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'pub_date': 'pub_date',
+    }),
+    'follow': (Follow.objects.order_by('pk'), {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def isoformat(value):
+    """Даты с микросекундами, чтобы загрузка вернула их как были."""
+    return value.isoformat()
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, пользователей, посты, комментарии и подписки '
+        'в JSON Lines: одна запись на строку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Файл выгрузки, по умолчанию стандартный вывод',
+        )
+
+    def handle(self, *args, output=None, **options):
+        if output is None:
+            counts = self.export(self.stdout.write)
+        else:
+            with open(output, 'w', encoding='utf-8') as stream:
+                counts = self.export(
+                    lambda line: stream.write(line + '\n')
+                )
+        self.stderr.write(', '.join(
+            f'{kind}: {count}' for kind, count in counts.items()
+        ))
+
+    def export(self, write):
+        counts = {}
+        for kind, (queryset, fields) in EXPORTS.items():
+            counts[kind] = 0
+            rows = queryset.values_list(*fields.values())
+            for row in rows.iterator(chunk_size=CHUNK_SIZE):
+                record = {'type': kind, **dict(zip(fields, row))}
+                write(json.dumps(
+                    record, ensure_ascii=False, default=isoformat
+                ))
+                counts[kind] += 1
+        return counts
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (THUMBNAIL_SIZES, find_thumbnails,
+                              generate_thumbnails)
+from posts.utilities import FEED_ORDERING
+
+
+CHUNK_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие миниатюры изображений постов, например '
+        'после перезапуска, при котором пропала очередь пула потоков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int,
+            help='Проверить только столько новых постов с изображениями',
+        )
+
+    def handle(self, *args, limit=None, **options):
+        posts = Post.objects.exclude(image='').order_by(*FEED_ORDERING)
+        if limit is not None:
+            posts = posts[:limit]
+        pks = list(posts.values_list('pk', flat=True))
+        generated = 0
+        for start in range(0, len(pks), CHUNK_SIZE):
+            generated += self.generate_missing(list(Post.objects.filter(
+                pk__in=pks[start:start + CHUNK_SIZE]
+            )))
+        self.stdout.write(
+            f'Проверено постов: {len(pks)}, созданы миниатюры: {generated}'
+        )
+
+    def generate_missing(self, posts):
+        found = find_thumbnails(
+            [post.image for post in posts], THUMBNAIL_SIZES
+        )
+        missing = [
+            post for post in posts
+            if any((post.image.name, size) not in found
+                   for size in THUMBNAIL_SIZES)
+        ]
+        for post in missing:
+            generate_thumbnails(post.pk)
+        return len(missing)
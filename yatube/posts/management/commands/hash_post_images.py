@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import SITE_FEED, bump_feeds
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения постов в хранилище с именами по хешу '
+        'содержимого; старые файлы удаляет сборщик осиротевших файлов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько файлов будет перенесено',
+        )
+
+    def handle(self, *args, dry_run=False, **options):
+        storage = Post._meta.get_field('image').storage
+        moved = duplicates = missing = 0
+        seen = set()
+        posts = Post.objects.exclude(image='').values_list('pk', 'image')
+        for pk, name in posts.iterator():
+            if storage.is_hashed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'нет файла: {name}'))
+                continue
+            with storage.open(name) as content:
+                new_name = storage.hashed_name(name, content)
+                if new_name in seen or storage.exists(new_name):
+                    duplicates += 1
+                seen.add(new_name)
+                if not dry_run:
+                    new_name = storage.save(name, content)
+            if not dry_run:
+                Post.objects.filter(pk=pk).update(image=new_name)
+            moved += 1
+        if moved and not dry_run:
+            bump_feeds(SITE_FEED)
+        action = 'Будет перенесено' if dry_run else 'Перенесено'
+        self.stdout.write(
+            f'{action} изображений: {moved}, из них дубликатов: '
+            f'{duplicates}, файлов не найдено: {missing}'
+        )
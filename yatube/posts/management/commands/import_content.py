@@ -0,0 +1,222 @@
+import json
+import sys
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from posts.caching import SITE_FEED, bump_feeds
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import index_posts
+from posts.timeline import (backfill_timelines, fan_out_posts,
+                            prune_timelines)
+from posts.utilities import keep_dates
+
+
+CHUNK_SIZE = 2000
+# Посты и комментарии получают новые id: id выгрузки могут быть заняты
+# другими строками. Уже загруженными считаются строки с теми же полями.
+POST_KEY = ('author_id', 'pub_date', 'text')
+COMMENT_KEY = ('post_id', 'author_id', 'pub_date', 'text')
+
+
+def read_chunks(lines, size):
+    """Пачки записей одного типа не больше size: (тип, записи)."""
+    kind, chunk = None, []
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if chunk and (record['type'] != kind or len(chunk) >= size):
+            yield kind, chunk
+            chunk = []
+        kind = record.pop('type')
+        chunk.append(record)
+    if chunk:
+        yield kind, chunk
+
+
+def user_ids(usernames):
+    return dict(User.objects.filter(
+        username__in=set(usernames)
+    ).values_list('username', 'pk'))
+
+
+def new_records(records, model, field):
+    """Записи, чьего ключа field еще нет в таблице, без повторов в пачке.
+
+    Уже загруженные записи пропускаются явно, а не через конфликты
+    вставки: повторная загрузка той же выгрузки ничего не меняет,
+    и в отчет попадают только добавленные строки.
+    """
+    taken = set(model.objects.filter(**{
+        f'{field}__in': {record[field] for record in records}
+    }).values_list(field, flat=True))
+    unique = {}
+    for record in records:
+        if record[field] not in taken:
+            unique.setdefault(record[field], record)
+    return list(unique.values())
+
+
+def natural_key(instance, fields):
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def find_existing(model, fields, instances):
+    """Строки model с теми же значениями fields, что у instances:
+    {значения: pk}. Кандидаты выбираются по первым двум полям.
+    """
+    if not instances:
+        return {}
+    rows = model.objects.filter(**{
+        f'{field}__in': {getattr(instance, field) for instance in instances}
+        for field in fields[:2]
+    }).values_list(*fields, 'pk')
+    return {tuple(row[:-1]): row[-1] for row in rows}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_content пачками bulk_create; '
+        'счетчики, ленты подписок и поисковый индекс обновляются. '
+        'Посты и комментарии получают новые id; группы, пользователи, '
+        'подписки и такие же посты и комментарии, уже есть в базе, '
+        'пропускаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки JSON Lines, - для stdin'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, path, chunk_size, **options):
+        self.imported, self.skipped = {}, 0
+        # id поста в выгрузке -> id поста в базе для комментариев.
+        self.post_ids = {}
+        # Ленты новых подписчиков заполняются один раз после загрузки.
+        self.followers = set()
+        if path == '-':
+            self.load(sys.stdin, chunk_size)
+        else:
+            with open(path, encoding='utf-8') as stream:
+                self.load(stream, chunk_size)
+        with transaction.atomic():
+            backfill_timelines(self.followers)
+        prune_timelines()
+        call_command('recount_counters', stdout=StringIO())
+        call_command('analyze_tables', stdout=StringIO())
+        bump_feeds(SITE_FEED)
+        self.stdout.write(', '.join(
+            f'{kind}: {count}' for kind, count in self.imported.items()
+        ) + f', пропущено: {self.skipped}')
+
+    def load(self, lines, chunk_size):
+        for kind, records in read_chunks(lines, chunk_size):
+            loader = getattr(self, f'load_{kind}s', None)
+            if loader is None:
+                raise CommandError(f'Неизвестный тип записи: {kind}')
+            with transaction.atomic():
+                objects = loader(records)
+            self.imported[kind] = self.imported.get(kind, 0) + len(objects)
+            self.skipped += len(records) - len(objects)
+
+    def load_groups(self, records):
+        groups = [
+            Group(**record) for record in new_records(records, Group, 'slug')
+        ]
+        Group.objects.bulk_create(groups)
+        return groups
+
+    def load_users(self, records):
+        users = [
+            User(password=make_password(None), **record)
+            for record in new_records(records, User, 'username')
+        ]
+        User.objects.bulk_create(users)
+        return users
+
+    def load_posts(self, records):
+        authors = user_ids(record['author'] for record in records)
+        groups = dict(Group.objects.filter(
+            slug__in={record['group'] for record in records}
+        ).values_list('slug', 'pk'))
+        posts = {
+            record['id']: Post(
+                author_id=authors[record['author']],
+                group_id=groups.get(record['group']),
+                text=record['text'],
+                pub_date=parse_datetime(record['pub_date']),
+                updated=parse_datetime(record['pub_date']),
+                image=record['image'],
+            )
+            for record in records if record['author'] in authors
+        }
+        existing = find_existing(Post, POST_KEY, posts.values())
+        new = {}
+        for post in posts.values():
+            key = natural_key(post, POST_KEY)
+            if key not in existing:
+                new.setdefault(key, post)
+        with keep_dates(Post):
+            Post.objects.bulk_create(new.values())
+        created = find_existing(Post, POST_KEY, new.values())
+        for key, post in new.items():
+            post.pk = created[key]
+        for source_id, post in posts.items():
+            key = natural_key(post, POST_KEY)
+            self.post_ids[source_id] = existing.get(key, created.get(key))
+        posts_created = list(new.values())
+        index_posts(posts_created)
+        fan_out_posts(posts_created)
+        return posts_created
+
+    def load_comments(self, records):
+        authors = user_ids(record['author'] for record in records)
+        comments = [
+            Comment(
+                post_id=self.post_ids[record['post']],
+                author_id=authors[record['author']],
+                text=record['text'],
+                pub_date=parse_datetime(record['pub_date']),
+            )
+            for record in records
+            if record['author'] in authors
+            and self.post_ids.get(record['post']) is not None
+        ]
+        existing = find_existing(Comment, COMMENT_KEY, comments)
+        new = {}
+        for comment in comments:
+            key = natural_key(comment, COMMENT_KEY)
+            if key not in existing:
+                new.setdefault(key, comment)
+        with keep_dates(Comment):
+            Comment.objects.bulk_create(new.values())
+        return list(new.values())
+
+    def load_follows(self, records):
+        users = user_ids(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        pairs = {
+            (users[record['user']], users[record['author']])
+            for record in records
+            if record['user'] in users and record['author'] in users
+        }
+        pairs -= set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        follows = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        ]
+        # Подписку могли создать одновременно с загрузкой.
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.followers.update(user_id for user_id, _ in pairs)
+        return follows
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import prune_timelines
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает ленты подписок до TIMELINE_LIMIT новых записей; '
+        'запускается периодически, например из cron'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Удалено записей лент: {prune_timelines()}')
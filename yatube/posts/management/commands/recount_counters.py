@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import (USER_COUNTERS, count_group_posts,
+                            count_user_stats)
+from posts.models import Group, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики пользователей и групп с таблицами и чинит их'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправлять',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, dry_run=False, **options):
+        fixed = self.check_users(dry_run) + self.check_groups(dry_run)
+        action = 'Найдено' if dry_run else 'Исправлено'
+        self.stdout.write(f'{action} расхождений: {fixed}')
+
+    def check_users(self, dry_run):
+        stored = {stats.pk: stats for stats in UserStats.objects.all()}
+        to_create, to_update = [], []
+        for user_id, actual in count_user_stats().items():
+            stats = stored.get(user_id)
+            if stats is None and not any(actual.values()):
+                continue
+            if stats is None:
+                to_create.append(UserStats(user_id=user_id, **actual))
+                self.report(f'пользователь {user_id}: нет счетчиков')
+                continue
+            wrong = {
+                field: value for field, value in actual.items()
+                if getattr(stats, field) != value
+            }
+            if wrong:
+                for field, value in wrong.items():
+                    self.report(
+                        f'пользователь {user_id}: {field} '
+                        f'{getattr(stats, field)} -> {value}'
+                    )
+                    setattr(stats, field, value)
+                to_update.append(stats)
+        if not dry_run:
+            UserStats.objects.bulk_create(to_create)
+            UserStats.objects.bulk_update(to_update, list(USER_COUNTERS))
+        return len(to_create) + len(to_update)
+
+    def check_groups(self, dry_run):
+        to_update = []
+        actual = count_group_posts()
+        for group in Group.objects.all():
+            if group.posts_count != actual[group.pk]:
+                self.report(
+                    f'группа {group.slug}: posts_count '
+                    f'{group.posts_count} -> {actual[group.pk]}'
+                )
+                group.posts_count = actual[group.pk]
+                to_update.append(group)
+        if not dry_run:
+            Group.objects.bulk_update(to_update, ['posts_count'])
+        return len(to_update)
+
+    def report(self, message):
+        self.stdout.write(self.style.WARNING(message))
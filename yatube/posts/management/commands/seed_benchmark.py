@@ -0,0 +1,183 @@
+import random
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts.caching import SITE_FEED, bump_feeds
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import index_posts
+from posts.timeline import rebuild_timeline
+from posts.utilities import keep_dates
+
+
+CHUNK_SIZE = 2000
+USERNAME_PREFIX = 'bench'
+# Текст постов и комментариев берется из заранее созданного набора
+# фраз: Faker на каждый пост замедлил бы заполнение в десятки раз.
+PHRASES = 500
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса закона Ципфа: первый элемент самый частый."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(
+        1, size + 1
+    )))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных тестов: '
+        'авторы с неравномерной активностью и степенной граф подписок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для авторов и подписок',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        faker = Faker('ru_RU')
+        faker.seed_instance(options['seed'])
+        self.phrases = [faker.paragraph() for _ in range(PHRASES)]
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days'])
+        users = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'], faker)
+        self.weights = zipf_weights(len(users), options['skew'])
+        post_ids = self.create_posts(users, groups, options['posts'])
+        self.create_comments(users, post_ids, options['comments'])
+        self.create_follows(users, options['follows'])
+        call_command('recount_counters', stdout=StringIO())
+        call_command('analyze_tables', stdout=StringIO())
+        bump_feeds(SITE_FEED)
+        follows = Follow.objects.filter(
+            user__username__startswith=USERNAME_PREFIX
+        ).count()
+        self.stdout.write(
+            f'Создано: пользователей {len(users)}, групп {len(groups)}, '
+            f'постов {len(post_ids)}, комментариев {options["comments"]}, '
+            f'подписок {follows}'
+        )
+
+    def chunks(self, total):
+        for start in range(0, total, CHUNK_SIZE):
+            yield range(start, min(start + CHUNK_SIZE, total))
+
+    def random_date(self):
+        return self.now - self.period * self.random.random()
+
+    def pick_users(self, users, count):
+        return self.random.choices(users, cum_weights=self.weights, k=count)
+
+    def create_users(self, total):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        password = make_password(None)
+        for chunk in self.chunks(total):
+            User.objects.bulk_create([
+                User(
+                    username=f'{USERNAME_PREFIX}{start + i}',
+                    password=password,
+                )
+                for i in chunk
+            ])
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('pk').values_list('pk', flat=True)[start:start + total])
+
+    def create_groups(self, total, faker):
+        start = Group.objects.count()
+        Group.objects.bulk_create([
+            Group(
+                title=faker.catch_phrase()[:200],
+                slug=f'{USERNAME_PREFIX}-{start + i}',
+                description=self.random.choice(self.phrases),
+            )
+            for i in range(total)
+        ])
+        return list(Group.objects.filter(
+            slug__startswith=f'{USERNAME_PREFIX}-'
+        ).values_list('pk', flat=True))
+
+    def create_follows(self, users, average):
+        """Число подписок и выбор авторов подчиняются закону Ципфа:
+        у немногих популярных авторов большинство подписчиков.
+        """
+        follows = []
+        for user_id in users:
+            count = min(
+                int(self.random.paretovariate(2) * average / 2), len(users)
+            )
+            follows += [
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in set(self.pick_users(users, count))
+                if author_id != user_id
+            ]
+            if len(follows) >= CHUNK_SIZE:
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                follows = []
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        # Ленты собираются один раз после всех постов: рассылка каждой
+        # пачки подписчикам популярных авторов писала бы в разы больше
+        # записей, чем остается после обрезки до TIMELINE_LIMIT.
+        for user_id in users:
+            with transaction.atomic():
+                rebuild_timeline(user_id)
+
+    def create_posts(self, users, groups, total):
+        post_ids = []
+        for chunk in self.chunks(total):
+            posts = []
+            for author_id in self.pick_users(users, len(chunk)):
+                pub_date = self.random_date()
+                posts.append(Post(
+                    author_id=author_id,
+                    group_id=(
+                        self.random.choice(groups)
+                        if groups and self.random.random() < 0.7 else None
+                    ),
+                    text=self.random.choice(self.phrases),
+                    pub_date=pub_date,
+                    updated=pub_date,
+                ))
+            with transaction.atomic(), keep_dates(Post):
+                Post.objects.bulk_create(posts)
+                posts = list(Post.objects.order_by('-pk')[:len(posts)])
+                index_posts(posts)
+            post_ids += [post.pk for post in posts]
+        return post_ids
+
+    def create_comments(self, users, post_ids, total):
+        if not post_ids:
+            return
+        for chunk in self.chunks(total):
+            with keep_dates(Comment):
+                Comment.objects.bulk_create([
+                    Comment(
+                        post_id=self.random.choice(post_ids),
+                        author_id=self.random.choice(users),
+                        text=self.random.choice(self.phrases)[:300],
+                        pub_date=self.random_date(),
+                    )
+                    for _ in chunk
+                ])
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Group = apps.get_model('posts', 'Group')
+    UserStats = apps.get_model('posts', 'UserStats')
+    for user in User.objects.annotate(
+        num_posts=Count('posts', distinct=True),
+        num_comments=Count('comments', distinct=True),
+        num_followers=Count('following', distinct=True),
+        num_following=Count('follower', distinct=True),
+    ).iterator():
+        UserStats.objects.create(
+            user=user,
+            posts_count=user.num_posts,
+            comments_count=user.num_comments,
+            followers_count=user.num_followers,
+            following_count=user.num_following,
+        )
+    for group in Group.objects.annotate(num_posts=Count('posts')):
+        group.posts_count = group.num_posts
+        group.save(update_fields=['posts_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0010_auto_20261017_0422'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Количество комментариев')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-pub_date', '-id'], name='comment_date_idx'),
+        ),
+    ]
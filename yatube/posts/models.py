@@ -1,9 +1,12 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import HashedFileSystemStorage
+
 
 User = get_user_model()
 TEXT_LIMIT = 15
+TIMELINE_LIMIT = 1000
 
 
 class Post(models.Model):
@@ -14,6 +17,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -31,11 +38,23 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=HashedFileSystemStorage(),
         blank=True
     )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:TEXT_LIMIT]
@@ -54,6 +73,11 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание группы'
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов'
+    )
 
     class Meta:
         indexes = [
@@ -88,6 +112,17 @@ class Comment(models.Model):
         verbose_name='Дата публикации'
     )
 
+    class Meta:
+        ordering = ('pub_date',)
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date'], name='comment_post_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'], name='comment_date_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -109,3 +144,67 @@ class Follow(models.Model):
                 fields=['user', 'author'], name='follow_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, заполняется при публикации поста."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='timeline_unique'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'], name='timeline_user_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, обновляются сигналами моделей."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество комментариев'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок'
+    )
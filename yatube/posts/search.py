@@ -0,0 +1,120 @@
+import base64
+import binascii
+import re
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .utilities import POSTS_ON_PAGES
+
+
+# Полнотекстовый индекс FTS5 по тексту постов, rowid — id поста.
+# Создается миграцией 0015 и обновляется сигналами Post.
+SEARCH_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+
+
+def match_query(query):
+    """Запрос FTS5 из слов пользователя: все слова, каждое по префиксу.
+
+    Операторы FTS5 из ввода не пробрасываются, поэтому любая строка
+    дает корректный запрос. Пустая строка, если слов нет.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def index_posts(posts):
+    """Индексирует пачку постов двумя запросами."""
+    with connections[router.db_for_write(Post)].cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [[post.pk] for post in posts],
+        )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, text) VALUES (%s, %s)',
+            [[post.pk, post.text] for post in posts],
+        )
+
+
+def unindex_post(post_id):
+    with connections[router.db_for_write(Post)].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def filter_by_search(posts, query):
+    """Посты, подходящие под запрос, подзапросом к индексу."""
+    match = match_query(query)
+    if not match:
+        return posts.none()
+    return posts.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [match],
+    ))
+
+
+def encode_search_cursor(score, pk):
+    raw = f'{score!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_search_cursor(token):
+    """Пара (релевантность, pk) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, pk = raw.decode().split('|')
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+
+def search_posts(query, group=None, author=None, after=None):
+    """Страница постов по запросу, лучшие совпадения первыми.
+
+    Сортировка по релевантности bm25 и id, следующая страница
+    выбирается по ключу (релевантность, id) без OFFSET.
+    Возвращает посты и курсор следующей страницы или None.
+    """
+    match = match_query(query)
+    if not match:
+        return [], None
+    conditions, params = [f'{SEARCH_TABLE} MATCH %s'], [match]
+    if group is not None:
+        conditions.append('post.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        conditions.append('post.author_id = %s')
+        params.append(author.pk)
+    if after is not None:
+        conditions.append(
+            f'(bm25({SEARCH_TABLE}) > %s '
+            f'OR (bm25({SEARCH_TABLE}) = %s AND post.id > %s))'
+        )
+        params += [after[0], after[0], after[1]]
+    sql = (
+        f'SELECT post.id, bm25({SEARCH_TABLE}) AS score '
+        f'FROM {SEARCH_TABLE} JOIN posts_post AS post '
+        f'ON post.id = {SEARCH_TABLE}.rowid '
+        f'WHERE {" AND ".join(conditions)} '
+        f'ORDER BY score, post.id LIMIT %s'
+    )
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        cursor.execute(sql, params + [POSTS_ON_PAGES + 1])
+        rows = cursor.fetchall()
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, score in rows[:POSTS_ON_PAGES]]
+    )
+    next_cursor = None
+    if len(rows) > POSTS_ON_PAGES:
+        next_cursor = encode_search_cursor(*reversed(
+            rows[POSTS_ON_PAGES - 1]
+        ))
+    return [
+        posts[pk] for pk, score in rows[:POSTS_ON_PAGES] if pk in posts
+    ], next_cursor
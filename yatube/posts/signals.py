@@ -0,0 +1,150 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import (bump_feeds, group_feed, post_feed, profile_feed,
+                      INDEX_FEED, SITE_FEED)
+from .counters import change_group_counter, change_user_counter
+from .models import Comment, Follow, Group, Post, User
+from .search import index_post, unindex_post
+from .timeline import (backfill_timeline, drop_post, drop_timeline,
+                       fan_out_post)
+
+
+def bump_post_feeds(post, previous_group_id=None, previous_author_id=None):
+    """Сбрасывает ленты, в которых показывается пост."""
+    feeds = [
+        INDEX_FEED, post_feed(post.pk), profile_feed(post.author.username)
+    ]
+    if post.group_id is not None:
+        feeds.append(group_feed(post.group.slug))
+    if previous_group_id not in (None, post.group_id):
+        feeds += [
+            group_feed(slug) for slug in Group.objects.filter(
+                pk=previous_group_id
+            ).values_list('slug', flat=True)
+        ]
+    if previous_author_id not in (None, post.author_id):
+        feeds += [
+            profile_feed(username) for username in User.objects.filter(
+                pk=previous_author_id
+            ).values_list('username', flat=True)
+        ]
+    bump_feeds(*feeds)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._previous_group_id = instance._previous_author_id = None
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_author_id = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'author_id'
+            ).first() or (None, None)
+        )
+
+
+def post_moved(post):
+    """Переносит пост между группами и авторами при изменении."""
+    if post._previous_group_id != post.group_id:
+        change_group_counter(post._previous_group_id, -1)
+        change_group_counter(post.group_id, 1)
+    if post._previous_author_id not in (None, post.author_id):
+        change_user_counter(post._previous_author_id, 'posts_count', -1)
+        change_user_counter(post.author_id, 'posts_count', 1)
+        drop_post(post.pk)
+        fan_out_post(post)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter(instance.author_id, 'posts_count', 1)
+        change_group_counter(instance.group_id, 1)
+        fan_out_post(instance)
+    else:
+        post_moved(instance)
+    index_post(instance)
+    bump_post_feeds(
+        instance, instance._previous_group_id, instance._previous_author_id
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, 'posts_count', -1)
+    change_group_counter(instance.group_id, -1)
+    unindex_post(instance.pk)
+    bump_post_feeds(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter(instance.author_id, 'comments_count', 1)
+        bump_feeds(post_feed(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, 'comments_count', -1)
+    bump_feeds(post_feed(instance.post_id))
+
+
+def bump_follow_feeds(follow):
+    """Сбрасывает профили подписчика и автора: в них счетчики
+    подписок и кнопка «Подписаться» / «Отписаться».
+    """
+    bump_feeds(
+        profile_feed(follow.author.username),
+        profile_feed(follow.user.username),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_user_counter(instance.author_id, 'followers_count', 1)
+        change_user_counter(instance.user_id, 'following_count', 1)
+        backfill_timeline(instance.user_id, instance.author_id)
+        bump_follow_feeds(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, 'followers_count', -1)
+    change_user_counter(instance.user_id, 'following_count', -1)
+    drop_timeline(instance.user_id, instance.author_id)
+    bump_follow_feeds(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_feeds(SITE_FEED)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    bump_feeds(SITE_FEED)
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    instance._previous_username = instance.username
+    if instance.pk is not None and (
+        update_fields is None or 'username' in update_fields
+    ):
+        instance._previous_username = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if instance._previous_username != instance.username:
+        bump_feeds(SITE_FEED)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_feeds(SITE_FEED)
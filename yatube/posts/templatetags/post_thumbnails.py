@@ -0,0 +1,21 @@
+from django import template
+
+from ..thumbnails import Picture, resolve_thumbnails
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Варианты изображения поста (Picture) или None.
+
+    Берутся из post.thumbnails, если миниатюры страницы найдены
+    заранее через resolve_thumbnails. Недостающие миниатюры
+    ставятся в очередь, а шаблон показывает исходное изображение.
+    """
+    if not post.image:
+        return None
+    if not hasattr(post, 'thumbnails'):
+        resolve_thumbnails([post])
+    return Picture(post.image, post.thumbnails)
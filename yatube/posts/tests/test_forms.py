@@ -61,13 +61,9 @@ class PostFormTests(TestCase):
             follow=True
         )
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text='test-text',
-                group=self.group.pk,
-                image='posts/small.gif'
-            ).exists()
-        )
+        post = Post.objects.get(text='test-text', group=self.group.pk)
+        self.assertTrue(post.image.name.startswith('posts/'))
+        self.assertTrue(post.image.storage.is_hashed(post.image.name))
 
     def test_post_edit(self):
         """Валидная форма редактирует пост."""
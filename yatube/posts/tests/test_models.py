@@ -1,9 +1,22 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from ..models import Group, Post
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
+from ..search import search_posts
+from ..thumbnails import generate_thumbnails
 
 
 User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class PostModelTest(TestCase):
@@ -27,3 +40,312 @@ class PostModelTest(TestCase):
         self.assertEqual(str_post, self.post.text[:15])
         str_group = str(self.group)
         self.assertEqual(str_group, self.group.title)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.another_group = Group.objects.create(
+            title='test-another-group',
+            slug='test-another-slug',
+            description='test-description',
+        )
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются при создании, правке и удалении объектов."""
+        post = Post.objects.create(
+            text='test-text', author=self.user, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.follower, text='text')
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.assertStats(self.user, posts_count=1, followers_count=1)
+        self.assertStats(
+            self.follower, comments_count=1, following_count=1
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.another_group
+        post.save()
+        self.group.refresh_from_db()
+        self.another_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.another_group.posts_count, 1)
+        post.delete()
+        self.assertStats(self.user, posts_count=0)
+        self.assertStats(self.follower, comments_count=0)
+        self.another_group.refresh_from_db()
+        self.assertEqual(self.another_group.posts_count, 0)
+
+    def test_author_change_moves_post(self):
+        """Смена автора переносит счетчик постов и записи лент
+        от подписчиков старого автора к подписчикам нового.
+        """
+        new_author = User.objects.create_user(username='new-author')
+        new_follower = User.objects.create_user(username='new-follower')
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=new_follower, author=new_author)
+        post = Post.objects.create(text='test-text', author=self.user)
+        post.author = new_author
+        post.save()
+        self.assertStats(self.user, posts_count=0)
+        self.assertStats(new_author, posts_count=1)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=post).values_list(
+                'user', flat=True
+            )),
+            [new_follower.pk],
+        )
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет расхождения."""
+        Post.objects.create(
+            text='test-text', author=self.user, group=self.group
+        )
+        UserStats.objects.filter(user=self.user).update(posts_count=7)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        out = StringIO()
+        call_command('recount_counters', '--dry-run', stdout=out)
+        self.assertIn('Найдено расхождений: 2', out.getvalue())
+        self.assertStats(self.user, posts_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertStats(self.user, posts_count=1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name, content):
+        return Post.objects.create(
+            text='test-text',
+            author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_uploads_deduplicated(self):
+        """Одинаковые изображения разных постов хранятся одним файлом."""
+        first = self.create_post('first.gif', b'GIF89a-same')
+        second = self.create_post('second.gif', b'GIF89a-same')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.storage.is_hashed(first.image.name))
+
+    def test_hash_post_images_moves_legacy_files(self):
+        """Команда hash_post_images переносит старые файлы
+        и записывает новые имена в посты.
+        """
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        posts = []
+        for name in ('old1.gif', 'old2.gif'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', name), 'wb') as f:
+                f.write(b'GIF89a-legacy')
+            post = self.create_post('tmp.gif', b'tmp')
+            Post.objects.filter(pk=post.pk).update(image=f'posts/{name}')
+            posts.append(post)
+        out = StringIO()
+        call_command('hash_post_images', '--dry-run', stdout=out)
+        self.assertIn('изображений: 2, из них дубликатов: 1', out.getvalue())
+        call_command('hash_post_images', stdout=StringIO())
+        names = set()
+        for post in posts:
+            post.refresh_from_db()
+            self.assertTrue(post.image.storage.is_hashed(post.image.name))
+            self.assertEqual(post.image.read(), b'GIF89a-legacy')
+            post.image.close()
+            names.add(post.image.name)
+        self.assertEqual(len(names), 1)
+
+    def test_collect_media_garbage_removes_orphans(self):
+        """Команда collect_media_garbage удаляет замененное изображение
+        с его миниатюрами и не трогает используемые файлы.
+        """
+        gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00'
+            b'\x00\x21\xF9\x04\x01\x00\x00\x00\x00\x2C\x00\x00'
+            b'\x00\x00\x01\x00\x01\x00\x00\x02\x01\x00\x00\x3B'
+        )
+        post = self.create_post('old.gif', gif)
+        generate_thumbnails(post.pk)
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('new.gif', gif + b'new', 'image/gif')
+        post.save()
+        generate_thumbnails(post.pk)
+        storage = post.image.storage
+        files_before = self.count_files()
+        out = StringIO()
+        call_command(
+            'collect_media_garbage', '--dry-run', '--min-age', '0',
+            stdout=out
+        )
+        self.assertIn('Будет удалено файлов: ', out.getvalue())
+        self.assertEqual(self.count_files(), files_before)
+        call_command('collect_media_garbage', '--min-age', '0', stdout=out)
+        self.assertFalse(storage.exists(old_name))
+        self.assertTrue(storage.exists(post.image.name))
+        deleted = files_before - self.count_files()
+        self.assertGreater(deleted, 1)
+        self.assertIn(f'Удалено файлов: {deleted}', out.getvalue())
+
+    def count_files(self):
+        return sum(len(files) for _, _, files in os.walk(TEMP_MEDIA_ROOT))
+
+
+class ContentTransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост про котиков'
+        )
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def snapshot(self):
+        return {
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'author__username', 'group__slug', 'text', 'pub_date'
+            )),
+            'comments': list(Comment.objects.values_list(
+                'post__text', 'author__username', 'text', 'pub_date'
+            )),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+        }
+
+    def export(self):
+        path = os.path.join(tempfile.mkdtemp(), 'content.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command(
+            'export_content', '--output', path, stderr=StringIO()
+        )
+        return path
+
+    def test_export_import_round_trip(self):
+        """Выгрузка export_content загружается import_content
+        с теми же данными, счетчиками, лентами и поиском.
+        """
+        before = self.snapshot()
+        path = self.export()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        out = StringIO()
+        call_command('import_content', path, '--chunk-size', '1', stdout=out)
+        self.assertIn('post: 2', out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(author.stats.posts_count, 2)
+        self.assertEqual(author.stats.followers_count, 1)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 2
+        )
+        self.assertEqual(
+            [post.text for post in search_posts('котик')[0]],
+            [self.post.text],
+        )
+
+    def test_import_skips_existing_records(self):
+        """Повторная загрузка добавляет только недостающие записи
+        и считает добавленные, а не переданные в базу.
+        """
+        before = self.snapshot()
+        path = self.export()
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        out = StringIO()
+        call_command('import_content', path, '--chunk-size', '1', stdout=out)
+        self.assertEqual(out.getvalue().strip(), (
+            'group: 0, user: 0, post: 0, comment: 1, follow: 1, '
+            'пропущено: 5'
+        ))
+        self.assertEqual(self.snapshot(), before)
+
+    def test_import_does_not_reuse_taken_ids(self):
+        """Посты выгрузки получают новые id, если их id заняты
+        другими постами, и комментарии переносятся к ним.
+        """
+        path = self.export()
+        Post.objects.all().delete()
+        local = Post.objects.create(
+            pk=self.post.pk, author=self.reader, text='Локальный пост'
+        )
+        out = StringIO()
+        call_command('import_content', path, stdout=out)
+        self.assertIn('post: 2, comment: 1', out.getvalue())
+        imported = Post.objects.get(text=self.post.text)
+        self.assertNotEqual(imported.pk, local.pk)
+        self.assertEqual(
+            list(imported.comments.values_list('text', flat=True)),
+            ['Комментарий'],
+        )
+        self.assertFalse(local.comments.exists())
+
+
+class BenchmarkSeedTest(TestCase):
+    def test_seed_and_benchmark_feeds(self):
+        """seed_benchmark заполняет базу согласованными данными,
+        benchmark_feeds выдает метрики по каждой ленте и не очищает
+        общий кеш.
+        """
+        call_command(
+            'seed_benchmark', '--users', '20', '--groups', '3',
+            '--posts', '100', '--comments', '50', '--follows', '4',
+            stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)),
+            100,
+        )
+        follow = Follow.objects.first()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=follow.user, post__author=follow.author
+        ).exists())
+        cache.set('kept', True)
+        out = StringIO()
+        call_command(
+            'benchmark_feeds', '--requests', '3', '--no-cache', stdout=out
+        )
+        self.assertTrue(cache.get('kept'))
+        views = json.loads(out.getvalue())['views']
+        self.assertEqual(set(views), {
+            'index', 'group_list', 'profile', 'post_detail', 'follow_index'
+        })
+        for metrics in views.values():
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
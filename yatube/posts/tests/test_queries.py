@@ -0,0 +1,212 @@
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..models import Post, Group, Comment, Follow
+from .utils import QueryBudgetMixin
+
+
+User = get_user_model()
+NUM_OF_TESTS_POSTS = 13
+# Бюджеты запросов для авторизованного пользователя,
+# включая чтение сессии и пользователя. Странице поста нужен
+# еще запрос автора для версий ее лент (ETag и кеш).
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 4,
+    'posts:profile': 5,
+    'posts:post_detail': 5,
+    'posts:follow_index': 4,
+}
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        for i in range(NUM_OF_TESTS_POSTS):
+            cls.post = Post.objects.create(
+                text=f'test-text{i}',
+                author=cls.user,
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.follower, text=f'comment{i}'
+            )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.follower)
+        cache.clear()
+
+    def get_pages(self):
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.user.username}
+            ),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        ]
+        next_pages = []
+        for url in pages:
+            page_obj = self.client.get(url).context.get('page_obj')
+            if page_obj is not None and page_obj.next_cursor:
+                next_pages.append(url + f'?after={page_obj.next_cursor}')
+        cache.clear()
+        return pages + next_pages
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по индексам, без сортировки во временном B-дереве."""
+        for url in self.get_pages():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                plan = self.explain(query['sql'])
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertFalse(
+                        any('TEMP B-TREE' in step for step in plan),
+                        '\n'.join(plan)
+                    )
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.post = Post.objects.create(
+            text='test-text', author=cls.user, group=cls.group
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def add_content(self, number):
+        for i in range(number):
+            commentator = User.objects.create_user(username=f'user{i}')
+            group = Group.objects.create(
+                title=f'group{i}', slug=f'group-{i}', description='text'
+            )
+            Post.objects.create(text='text', author=self.user, group=group)
+            Comment.objects.create(
+                post=self.post, author=commentator, text='text'
+            )
+
+    def check_budgets(self):
+        kwargs = {
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.user.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+        }
+        for name, budget in QUERY_BUDGETS.items():
+            url = reverse(name, kwargs=kwargs.get(name))
+            cache.clear()
+            with self.subTest(url=url), self.assertMaxQueries(budget):
+                self.client.get(url)
+
+    def test_views_fit_query_budgets(self):
+        """Число запросов страниц не зависит от числа постов
+        и комментариев на них.
+        """
+        self.check_budgets()
+        self.add_content(NUM_OF_TESTS_POSTS)
+        self.check_budgets()
+
+
+class AdminQueryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.group = Group.objects.create(
+            title='test-group', slug='test-slug', description='text'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'text{i}', author=cls.admin, group=cls.group
+            )
+            Comment.objects.create(post=post, author=cls.admin, text='text')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def count_queries(self):
+        counts = {}
+        for name in (
+            'admin:posts_post_changelist',
+            'admin:posts_comment_changelist',
+            'admin:posts_follow_changelist',
+            'admin:posts_comment_add',
+            'admin:posts_follow_add',
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name))
+            counts[name] = len(queries)
+        return counts
+
+    def test_admin_pages_do_not_load_related_tables(self):
+        """Страницы админки не грузят все группы, пользователей
+        и посты в выпадающие списки.
+        """
+        self.count_queries()
+        counts = self.count_queries()
+        for i in range(20):
+            user = User.objects.create_user(username=f'user{i}')
+            Group.objects.create(
+                title=f'group{i}', slug=f'group-{i}', description='text'
+            )
+            Follow.objects.create(user=user, author=self.admin)
+        self.assertEqual(self.count_queries(), counts)
+
+    def changelist_count(self):
+        with mock.patch('posts.admin.EXACT_COUNT_LIMIT', 1):
+            response = self.client.get(
+                reverse('admin:posts_post_changelist')
+            )
+        return response.context['cl'].result_count
+
+    def test_changelist_count_is_estimated(self):
+        """Большой список без статистики ANALYZE считается точно,
+        после analyze_tables число строк берется из статистики.
+        """
+        self.assertEqual(self.changelist_count(), 3)
+        call_command('analyze_tables', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = '1000' WHERE tbl = %s",
+                [Post._meta.db_table],
+            )
+        self.assertEqual(self.changelist_count(), 1000)
@@ -1,14 +1,24 @@
+from hashlib import md5
+from io import StringIO
 import shutil
+from http import HTTPStatus
 import tempfile
+from unittest import mock
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from ..models import Post, Group, Follow
-from ..utilities import POSTS_ON_PAGES
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from ..models import Post, Group, Follow, TimelineEntry, Comment
+from ..search import filter_by_search
+from ..thumbnails import (generate_thumbnails, resolve_thumbnails,
+                          CARD_FORMATS, CARD_WIDTHS)
+from ..utilities import POSTS_ON_PAGES, encode_cursor
 
 
 User = get_user_model()
@@ -237,6 +247,58 @@ class PaginatorViewsTest(TestCase):
                 NUM_OF_TESTS_POSTS - POSTS_ON_PAGES
             )
 
+    def test_cursor_pages_follow_each_other(self):
+        """Курсоры ?after=/?before= листают ленту без пропусков."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'posts:profile', kwargs={'username': self.user.username}
+            ),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                first_page = self.author_client.get(url).context['page_obj']
+                response = self.author_client.get(
+                    url + f'?after={first_page.next_cursor}'
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(
+                    list(second_page),
+                    list(Post.objects.order_by('-pub_date', '-pk')[
+                        POSTS_ON_PAGES:NUM_OF_TESTS_POSTS
+                    ])
+                )
+                self.assertFalse(second_page.has_next())
+                self.assertContains(
+                    response, f'?before={encode_cursor(second_page[0])}'
+                )
+                response = self.author_client.get(
+                    url + f'?before={second_page.previous_cursor}'
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page)
+                )
+                cache.clear()
+
+    def test_broken_cursor_opens_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.author_client.get(
+            reverse('posts:index') + '?after=broken'
+        )
+        self.assertEqual(len(response.context['page_obj']), POSTS_ON_PAGES)
+
+    def test_numbered_pages_are_capped(self):
+        """Номера есть только у первых страниц, глубже — курсоры."""
+        with mock.patch('posts.utilities.NUMBERED_PAGES', 1):
+            response = self.author_client.get(
+                reverse('posts:index') + '?page=2'
+            )
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertNotContains(response, '?page=2')
+        self.assertContains(response, f'?after={page_obj.next_cursor}')
+
 
 class CreationPostTest(TestCase):
     @classmethod
@@ -304,49 +366,469 @@ class CacheTest(TestCase):
 
     def setUp(self):
         self.author_client = Client()
+        cache.clear()
 
     def test_cache(self):
-        """Список записей на главной странице кешируется,
-        и обновляется раз в 20 секунд
+        """Главная страница кешируется, пока посты не меняются,
+        и сразу обновляется после публикации нового поста.
         """
         response_first = self.author_client.get(
             reverse('posts:index')
         )
-        Post.objects.create(
-            text='test-text',
-            author=self.user,
-        )
+        Post.objects.bulk_create([Post(text='test-text', author=self.user)])
         response_second = self.author_client.get(
             reverse('posts:index')
         )
         self.assertEqual(response_first.content, response_second.content)
-        cache.clear()
+        Post.objects.create(
+            text='test-text',
+            author=self.user,
+        )
         response_third = self.author_client.get(
             reverse('posts:index')
         )
         self.assertNotEqual(response_first.content, response_third.content)
 
     def test_cache_delete(self):
-        """При удалении записи из базы, она остается
-         на главной странице пока кеш не очищен
+        """При удалении записи она сразу пропадает
+        со страниц, где показывалась.
         """
+        group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
         post = Post.objects.create(
-            text='test-text',
+            text='test-text-to-delete',
             author=self.user,
+            group=group,
         )
-        response_first = self.author_client.get(
-            reverse('posts:index')
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
         )
+        for url in urls:
+            self.assertContains(self.author_client.get(url), post.text)
         post.delete()
-        response_second = self.author_client.get(
-            reverse('posts:index')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.author_client.get(url), post.text
+                )
+
+    def test_group_rename_resets_feeds(self):
+        """Переименование группы сбрасывает кеш главной страницы."""
+        group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
         )
-        self.assertEqual(response_first.content, response_second.content)
+        Post.objects.create(text='test-text', author=self.user, group=group)
+        self.author_client.get(reverse('posts:index'))
+        group.title = 'test-renamed-group'
+        group.save()
+        self.assertContains(
+            self.author_client.get(reverse('posts:index')),
+            'test-renamed-group'
+        )
+
+
+class AnonymousCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.post = Post.objects.create(
+            text='test-text',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
         cache.clear()
-        response_third = self.author_client.get(
-            reverse('posts:index')
+
+    def test_guest_pages_cached_until_change(self):
+        """Страницы группы, профиля и поста кешируются для гостей
+        до изменения показанных на них объектов.
+        """
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
         )
-        self.assertNotEqual(response_first.content, response_third.content)
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(
+            text='hidden-text', updated=timezone.now()
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.guest_client.get(url), 'hidden-text'
+                )
+                self.assertContains(
+                    self.author_client.get(url), 'hidden-text'
+                )
+        self.post.text = 'edited-text'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'edited-text'
+                )
+
+    def test_comment_resets_post_page(self):
+        """Новый комментарий сразу виден гостям на странице поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='test-comment'
+        )
+        self.assertContains(self.guest_client.get(url), 'test-comment')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='test-text', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_not_modified_until_post_edit(self):
+        """Страницы отвечают 304 по ETag, пока пост не изменен."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        etags = {}
+        for url in urls:
+            response = self.guest_client.get(url)
+            self.assertIn('no-cache', response['Cache-Control'])
+            etags[url] = response['ETag']
+            response = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=etags[url]
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.post.text = 'test-text-edited'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_stale_page_has_no_validators(self):
+        """Устаревшая страница, отданная во время пересчета,
+        приходит без ETag и Last-Modified новых версий лент.
+        """
+        group = Group.objects.create(title='Группа', slug='stale-group')
+        url = reverse('posts:group_list', kwargs={'slug': group.slug})
+        self.guest_client.get(url)
+        new_post = Post.objects.create(
+            text='new-post-text', author=self.user, group=group
+        )
+        key = 'group_page.' + md5(f'{url}:0'.encode()).hexdigest()
+        cache.add(f'{key}.lock', True)
+        response = self.guest_client.get(url)
+        self.assertNotContains(response, new_post.text)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        cache.delete(f'{key}.lock')
+        response = self.guest_client.get(url)
+        self.assertContains(response, new_post.text)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_follow_changes_profile_etag(self):
+        """После подписки профиль автора не отвечает 304
+        со старым ETag: на странице другая кнопка.
+        """
+        follower = User.objects.create_user(username='follower')
+        client = Client()
+        client.force_login(follower)
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        etag = client.get(url)['ETag']
+        client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.user})
+        )
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['following'])
+
+    def test_new_login_changes_etag(self):
+        """После повторного входа ETag другой: в сохраненной
+        странице устаревший CSRF-токен.
+        """
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        client.logout()
+        client.force_login(self.user)
+        client.get(url)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.post = Post.objects.create(
+            text='test-text', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def render_card(self):
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        return render_to_string(
+            'includes/post.html', {'post': post, 'forloop': {'last': True}}
+        )
+
+    def test_card_cached_until_post_or_group_change(self):
+        """Карточка поста берется из кеша до правки поста
+        или переименования группы.
+        """
+        self.render_card()
+        Post.objects.filter(pk=self.post.pk).update(text='hidden-text')
+        self.assertNotIn('hidden-text', self.render_card())
+        self.post.text = 'edited-text'
+        self.post.save()
+        self.assertIn('edited-text', self.render_card())
+        self.group.title = 'renamed-group'
+        self.group.save()
+        self.assertIn('renamed-group', self.render_card())
+
+    def test_benchmark_keeps_shared_cache(self):
+        """benchmark_post_cards очищает только свой временный кеш."""
+        Post.objects.bulk_create(
+            Post(text=f'text{i}', author=self.user)
+            for i in range(POSTS_ON_PAGES)
+        )
+        cache.set('kept', True)
+        out = StringIO()
+        call_command('benchmark_post_cards', '--rounds', '2', stdout=out)
+        self.assertIn('ускорение', out.getvalue())
+        self.assertTrue(cache.get('kept'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='test-text',
+            author=cls.user,
+            image=SimpleUploadedFile('thumb.gif', cls.small_gif, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def render_card(self):
+        return render_to_string(
+            'includes/post.html',
+            {'post': Post.objects.get(pk=self.post.pk),
+             'forloop': {'last': True}}
+        )
+
+    @mock.patch('posts.thumbnails.queue_thumbnails')
+    def test_original_image_until_thumbnail_ready(self, queue_thumbnails):
+        """Пока миниатюры нет, показывается исходное изображение,
+        а создание миниатюры ставится в очередь.
+        """
+        self.assertIn(self.post.image.url, self.render_card())
+        queue_thumbnails.assert_called_once_with(self.post)
+        generate_thumbnails(self.post.pk)
+        card = self.render_card()
+        self.assertNotIn(self.post.image.url, card)
+        self.assertIn(settings.MEDIA_URL + 'cache/', card)
+        self.assertEqual(queue_thumbnails.call_count, 1)
+
+    @mock.patch('posts.thumbnails.queue_thumbnails')
+    def test_card_has_responsive_variants(self, queue_thumbnails):
+        """Карточка с готовыми миниатюрами отдает варианты по ширине,
+        размеры изображения и ленивую загрузку.
+        """
+        generate_thumbnails(self.post.pk)
+        card = self.render_card()
+        for width in CARD_WIDTHS:
+            self.assertIn(f' {width}w', card)
+        self.assertIn('width="960" height="339"', card)
+        self.assertIn('loading="lazy"', card)
+        self.assertEqual(
+            'image/webp' in card, 'WEBP' in CARD_FORMATS
+        )
+        queue_thumbnails.assert_not_called()
+
+    def test_command_generates_missing_thumbnails(self):
+        """generate_thumbnails создает только недостающие миниатюры,
+        например потерянные при перезапуске пула.
+        """
+        for generated in (1, 0):
+            out = StringIO()
+            call_command('generate_thumbnails', stdout=out)
+            self.assertIn(
+                f'Проверено постов: 1, созданы миниатюры: {generated}',
+                out.getvalue(),
+            )
+        self.assertNotIn(self.post.image.url, self.render_card())
+
+    @mock.patch('posts.thumbnails.queue_thumbnails')
+    def test_page_thumbnails_resolved_in_one_query(self, queue_thumbnails):
+        """Миниатюры страницы находятся одним запросом до рендера,
+        шаблон их больше не ищет.
+        """
+        for i in range(3):
+            Post.objects.create(
+                text=f'text{i}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f'thumb{i}.gif', self.small_gif + bytes([i]), 'image/gif'
+                ),
+            )
+        posts = list(Post.objects.select_related('author', 'group'))
+        generate_thumbnails(posts[0].pk)
+        cache.clear()
+        with self.assertNumQueries(1):
+            resolve_thumbnails(posts)
+        self.assertEqual(queue_thumbnails.call_count, len(posts) - 1)
+        with self.assertNumQueries(0):
+            cards = [
+                render_to_string(
+                    'includes/post.html',
+                    {'post': post, 'forloop': {'last': True}}
+                ) for post in posts
+            ]
+        self.assertIn(posts[0].thumbnails['card'].url, cards[0])
+        self.assertIn(posts[1].image.url, cards[1])
+
+    @mock.patch('posts.views.queue_thumbnails')
+    def test_post_create_queues_thumbnails(self, queue_thumbnails):
+        """Создание поста с изображением ставит миниатюры в очередь."""
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_create'), data={
+            'text': 'new-text',
+            'image': SimpleUploadedFile(
+                'new.gif', self.small_gif, 'image/gif'
+            ),
+        })
+        queue_thumbnails.assert_called_once_with(
+            Post.objects.get(text='new-text')
+        )
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.best = Post.objects.create(
+            text='Котики, котики и еще раз котики', author=cls.user
+        )
+        cls.grouped = Post.objects.create(
+            text='Котик в группе', author=cls.user, group=cls.group
+        )
+        cls.foreign = Post.objects.create(
+            text='Чужой котик', author=cls.other
+        )
+        Post.objects.create(text='Про собак', author=cls.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return response, response.context['posts']
+
+    def test_search_ranks_and_filters(self):
+        """Поиск находит посты по началу слова, лучшие совпадения
+        первыми, и фильтрует по группе и автору.
+        """
+        response, posts = self.search(q='КОТ')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(posts), 3)
+        self.assertEqual(posts[0], self.best)
+        self.assertEqual(self.search(q='кот', group='test-slug')[1], [
+            self.grouped
+        ])
+        self.assertEqual(self.search(q='кот', author='other')[1], [
+            self.foreign
+        ])
+        self.assertEqual(self.search(q='"(* OR')[1], [])
+
+    def test_search_index_follows_posts(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.get(pk=self.foreign.pk)
+        post.text = 'Теперь про хомяков'
+        post.save()
+        self.assertEqual(self.search(q='хомяк')[1], [post])
+        self.assertNotIn(post, self.search(q='котик')[1])
+        post.delete()
+        self.assertEqual(self.search(q='хомяк')[1], [])
+        self.assertEqual(
+            list(filter_by_search(Post.objects.all(), 'собак')),
+            list(Post.objects.filter(text='Про собак')),
+        )
+
+    def test_search_keyset_pagination(self):
+        """Следующая страница продолжает выдачу без повторов."""
+        for i in range(POSTS_ON_PAGES):
+            Post.objects.create(text=f'Котик номер {i}', author=self.other)
+        response, first = self.search(q='котик')
+        self.assertEqual(len(first), POSTS_ON_PAGES)
+        query = response.context['next_query']
+        self.assertIn('q=', query)
+        response = self.client.get(reverse('posts:search') + '?' + query)
+        second = response.context['posts']
+        self.assertEqual(len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertIsNone(response.context['next_query'])
 
 
 class FollowTest(TestCase):
@@ -415,3 +897,42 @@ class FollowTest(TestCase):
             reverse('posts:follow_index')
         )
         self.assertNotIn(self.post, response.context['posts'])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора,
+        prune_timelines обрезает ленты до TIMELINE_LIMIT записей.
+        """
+        Follow.objects.create(user=self.user, author=self.author)
+        with mock.patch('posts.timeline.TIMELINE_LIMIT', 2):
+            new_posts = [
+                Post.objects.create(text=f'test-text{i}', author=self.author)
+                for i in range(3)
+            ]
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=self.user).count(), 4
+            )
+            call_command('prune_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(
+                TimelineEntry.objects.filter(user=self.user).values_list(
+                    'post', flat=True
+                )
+            ),
+            [new_posts[2].pk, new_posts[1].pk]
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.unfollower).exists()
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора убираются из ленты."""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.user, post=self.post
+            ).exists()
+        )
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists()
+        )
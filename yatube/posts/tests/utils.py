@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что блок кода укладывается в бюджет SQL-запросов."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        executed = len(queries.captured_queries)
+        self.assertLessEqual(
+            executed,
+            budget,
+            f'{executed} запросов при бюджете {budget}:\n' + '\n'.join(
+                query['sql'] for query in queries.captured_queries
+            )
+        )
@@ -0,0 +1,229 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import metrics
+
+from .models import Post
+from .signals import bump_post_feeds
+
+
+logger = logging.getLogger(__name__)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширины вариантов карточки и атрибут sizes для srcset.
+CARD_WIDTHS = (480, 960)
+CARD_SIZES_ATTR = '(max-width: 576px) 100vw, 960px'
+CARD_FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+# Размеры миниатюр из шаблонов: имя размера -> геометрия и опции sorl.
+# 'card' (960 px, JPEG) остается src по умолчанию для старых браузеров.
+THUMBNAIL_SIZES = {
+    'card': ('960x339', CARD_OPTIONS),
+    **{
+        f'card_{image_format.lower()}_{width}': (
+            f'{width}x{round(width * 339 / 960)}',
+            {**CARD_OPTIONS, 'format': image_format},
+        )
+        for image_format in CARD_FORMATS for width in CARD_WIDTHS
+        if (image_format, width) != ('JPEG', 960)
+    },
+}
+# Очередь пула живет в памяти процесса. Задачи идемпотентны: потерянные
+# при перезапуске снова ставит в очередь показ страницы с постом,
+# а все недостающие миниатюры досоздает команда generate_thumbnails.
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры с умолчаниями, как их дополняет sorl
+    перед построением имени файла.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(image, size):
+    """Файл миниатюры размера size, как его назовет sorl."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def find_thumbnails(images, sizes):
+    """Готовые миниатюры изображений: (имя, размер) -> миниатюра.
+
+    Хранилище ключей sorl читается одним get_many из кеша и одним
+    запросом к БД для промахов вместо запроса на каждую миниатюру.
+    """
+    if not images:
+        return {}
+    kvstore = default.kvstore
+    keys = {
+        add_prefix(thumbnail_file(image, size).key): (image.name, size)
+        for image in images for size in sizes
+    }
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStore.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        loaded = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(
+            loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(loaded)
+    return {
+        name: deserialize_image_file(values[key])
+        for key, name in keys.items() if values[key] != EMPTY_VALUE
+    }
+
+
+def resolve_thumbnails(posts):
+    """Заранее находит все миниатюры изображений постов страницы.
+
+    Результат хранится в post.thumbnails для тега post_picture,
+    создание недостающих миниатюр ставится в очередь.
+    """
+    posts = [post for post in posts if post.image]
+    thumbnails = find_thumbnails(
+        [post.image for post in posts], THUMBNAIL_SIZES
+    )
+    for post in posts:
+        post.thumbnails = {
+            size: thumbnails.get((post.image.name, size))
+            for size in THUMBNAIL_SIZES
+        }
+        if None in post.thumbnails.values():
+            queue_thumbnails(post)
+
+
+class Picture:
+    """Варианты изображения поста для тега <picture>.
+
+    Пока миниатюры 'card' нет, src — исходное изображение
+    без размеров и srcset.
+    """
+
+    def __init__(self, image, thumbnails):
+        self.image = image
+        self.thumbnails = thumbnails
+        self.src = thumbnails.get('card') or image
+        self.sizes = CARD_SIZES_ATTR
+
+    def srcset(self, image_format):
+        if not self.thumbnails.get('card'):
+            return ''
+        variants = sorted(
+            (thumbnail.width, thumbnail.url)
+            for size, thumbnail in self.thumbnails.items()
+            if thumbnail is not None
+            and THUMBNAIL_SIZES[size][1].get('format', 'JPEG') == image_format
+        )
+        return ', '.join(f'{url} {width}w' for width, url in variants)
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('WEBP')
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('JPEG')
+
+    @property
+    def key(self):
+        """Часть ключа кеша карточки: набор готовых миниатюр."""
+        return ','.join(
+            size for size, thumbnail in sorted(self.thumbnails.items())
+            if thumbnail is not None
+        )
+
+
+def generate_thumbnails(post_id):
+    """Создает все миниатюры поста и сбрасывает ленты с ним."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image:
+        return
+    start = perf_counter()
+    for geometry, options in THUMBNAIL_SIZES.values():
+        get_thumbnail(post.image, geometry, **options)
+    metrics.observe(
+        'yatube_thumbnail_duration_seconds', perf_counter() - start
+    )
+    bump_post_feeds(post)
+
+
+def _generate(post_id):
+    try:
+        generate_thumbnails(post_id)
+    except Exception:
+        metrics.inc('yatube_thumbnail_errors_total')
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+    finally:
+        with _lock:
+            _pending.discard(post_id)
+
+
+def _run_job(post_id):
+    try:
+        _generate(post_id)
+    finally:
+        connections.close_all()
+
+
+def _submit(post_id):
+    with _lock:
+        if post_id in _pending:
+            return
+        _pending.add(post_id)
+    if not settings.THUMBNAIL_WORKERS:
+        # Без пула миниатюры создаются сразу, в потоке запроса.
+        _generate(post_id)
+        return
+    get_executor().submit(_run_job, post_id)
+
+
+def queue_thumbnails(post):
+    """Ставит создание миниатюр поста в очередь пула потоков
+    после фиксации транзакции.
+    """
+    if post.image:
+        transaction.on_commit(lambda: _submit(post.pk))
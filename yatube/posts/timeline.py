@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from django.db import connections, router
+
+from .models import Follow, Post, TimelineEntry, TIMELINE_LIMIT
+
+
+def prune_timeline(user_ids):
+    """Оставляет в ленте каждого пользователя TIMELINE_LIMIT новых записей."""
+    for user_id in user_ids:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        newest = entries.order_by('-pub_date', '-id').values('id')
+        entries.exclude(id__in=newest[:TIMELINE_LIMIT]).delete()
+
+
+def prune_timelines():
+    """Обрезает все ленты до TIMELINE_LIMIT новых записей одним запросом.
+
+    Рассылка поста ленты не обрезает: у автора с большим числом
+    подписчиков это были бы тысячи DELETE в транзакции публикации.
+    Команда prune_timelines запускается периодически.
+    """
+    table = TimelineEntry._meta.db_table
+    with connections[router.db_for_write(TimelineEntry)].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY user_id ORDER BY pub_date DESC, id DESC'
+            f') AS position FROM {table}) AS ranked WHERE position > %s)',
+            [TIMELINE_LIMIT],
+        )
+        return cursor.rowcount
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Добавляет посты в ленты подписчиков их авторов."""
+    followers = defaultdict(list)
+    for author_id, user_id in Follow.objects.filter(
+        author_id__in={post.author_id for post in posts}
+    ).values_list('author_id', 'user_id'):
+        followers[author_id].append(user_id)
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for post in posts for user_id in followers[post.author_id]
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).order_by('-pub_date')
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts.values_list(
+                'pk', 'pub_date'
+            )[:TIMELINE_LIMIT]
+        ],
+        ignore_conflicts=True,
+    )
+    prune_timeline([user_id])
+
+
+def backfill_timelines(user_ids, batch_size=500):
+    """Добавляет в ленты пользователей последние посты их подписок.
+
+    Для массовых подписок при загрузке: на пачку пользователей один
+    INSERT ... SELECT, каждому не больше TIMELINE_LIMIT новых постов
+    всех его авторов. Ленты не обрезаются, это делает prune_timelines.
+    """
+    table = TimelineEntry._meta.db_table
+    follows, posts = Follow._meta.db_table, Post._meta.db_table
+    user_ids = sorted(user_ids)
+    with connections[router.db_for_write(TimelineEntry)].cursor() as cursor:
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, post_id, pub_date) '
+                f'SELECT user_id, post_id, pub_date FROM ('
+                f'SELECT f.user_id, p.id AS post_id, p.pub_date, '
+                f'ROW_NUMBER() OVER (PARTITION BY f.user_id '
+                f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+                f'FROM {follows} f JOIN {posts} p '
+                f'ON p.author_id = f.author_id '
+                f'WHERE f.user_id IN ({placeholders})) AS ranked '
+                f'WHERE position <= %s AND NOT EXISTS ('
+                f'SELECT 1 FROM {table} t WHERE t.user_id = ranked.user_id '
+                f'AND t.post_id = ranked.post_id)',
+                [*batch, TIMELINE_LIMIT],
+            )
+
+
+def rebuild_timeline(user_id):
+    """Собирает ленту заново из последних постов авторов подписок."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user_id=user_id
+    ).order_by('-pub_date')
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.values_list(
+            'pk', 'pub_date'
+        )[:TIMELINE_LIMIT]
+    ])
+
+
+def drop_post(post_id):
+    """Убирает пост из лент всех подписчиков, например после смены автора."""
+    TimelineEntry.objects.filter(post_id=post_id).delete()
+
+
+def drop_timeline(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
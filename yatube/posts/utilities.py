@@ -1,11 +1,127 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+from contextlib import contextmanager
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 
 POSTS_ON_PAGES = 10
+# Номерами ?page= открываются только первые страницы: OFFSET дальше
+# читал бы и отбрасывал все предыдущие посты, глубже листают курсорами.
+NUMBERED_PAGES = 5
+FEED_ORDERING = ('-pub_date', '-pk')
+
+
+def encode_cursor(post):
+    """Кодирует позицию поста в ленте в непрозрачный токен."""
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает пару (pub_date, pk) или None для битого токена."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, pk = raw.decode().split('|')
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты, выбранная по ключу (pub_date, pk) без OFFSET."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
 
+    def has_previous(self):
+        return self._has_previous
 
-def get_paginator(posts, request):
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def get_cursor_page(posts, after=None, before=None):
     paginator = Paginator(posts, POSTS_ON_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if after is not None:
+        pub_date, pk = after
+        posts = posts.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        )
+    else:
+        pub_date, pk = before
+        posts = posts.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).reverse()
+    object_list = list(posts[:POSTS_ON_PAGES + 1])
+    has_more = len(object_list) > POSTS_ON_PAGES
+    object_list = object_list[:POSTS_ON_PAGES]
+    if before is not None:
+        object_list.reverse()
+        return CursorPage(object_list, paginator, True, has_more)
+    return CursorPage(object_list, paginator, has_more, True)
+
+
+def set_cursors(page_obj):
+    """Добавляет странице токены соседних страниц для ссылок навигации."""
+    page_obj.next_cursor = page_obj.previous_cursor = None
+    if not len(page_obj):
+        return page_obj
+    if page_obj.has_next():
+        page_obj.next_cursor = encode_cursor(page_obj[len(page_obj) - 1])
+    if page_obj.has_previous():
+        page_obj.previous_cursor = encode_cursor(page_obj[0])
     return page_obj
+
+
+def get_paginator(posts, request, count=None):
+    """Страница ленты; count — заранее известное число постов,
+    чтобы не выполнять COUNT(*) по таблице.
+    """
+    posts = posts.order_by(*FEED_ORDERING)
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+    if after is not None or before is not None:
+        return set_cursors(get_cursor_page(posts, after, before))
+    paginator = Paginator(posts, POSTS_ON_PAGES)
+    if count is not None:
+        paginator.count = count
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+    page_obj = paginator.get_page(max(1, min(page_number, NUMBERED_PAGES)))
+    page_obj.page_links = paginator.page_range[:NUMBERED_PAGES]
+    return set_cursors(page_obj)
+
+
+@contextmanager
+def keep_dates(model):
+    """bulk_create сохраняет заданные даты вместо auto_now и auto_now_add."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
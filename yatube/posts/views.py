@@ -1,17 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-from .models import Post, Group, User, Follow
+from django.db import transaction
+from core.routers import read_from_replica
+from .models import Post, Group, User, Follow, TimelineEntry
 from .forms import PostForm, CommentForm
+from .caching import (cache_anonymous, cache_feed, conditional_feed,
+                      group_feed, post_feeds, profile_feed, INDEX_FEED)
+from .counters import get_user_stats
+from .search import decode_search_cursor, search_posts
+from .thumbnails import queue_thumbnails, resolve_thumbnails
 from .utilities import get_paginator
 
 
-@cache_page(20, key_prefix='index_page')
+@read_from_replica
+@conditional_feed(lambda: [INDEX_FEED])
+@cache_feed('index_page', lambda: [INDEX_FEED])
 def index(request):
     posts = Post.objects.all().select_related(
-        'author'
+        'author', 'group'
     )
     page_obj = get_paginator(posts, request)
+    resolve_thumbnails(page_obj)
     context = {
         'posts': posts,
         'page_obj': page_obj,
@@ -19,12 +28,16 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@conditional_feed(lambda slug: [group_feed(slug)])
+@cache_anonymous('group_page', lambda slug: [group_feed(slug)])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.all().select_related(
-        'author'
+        'author', 'group'
     )
-    page_obj = get_paginator(posts, request)
+    page_obj = get_paginator(posts, request, count=group.posts_count)
+    resolve_thumbnails(page_obj)
     context = {
         'group': group,
         'posts': posts,
@@ -33,10 +46,21 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@conditional_feed(lambda username: [profile_feed(username)])
+@cache_anonymous(
+    'profile_page', lambda username: [profile_feed(username)]
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = get_paginator(posts, request)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    quantity = get_user_stats(author).posts_count
+    posts = author.posts.all().select_related(
+        'author', 'group'
+    )
+    page_obj = get_paginator(posts, request, count=quantity)
+    resolve_thumbnails(page_obj)
     is_following = (request.user.is_authenticated
                     and Follow.objects.filter(
                         user=request.user,
@@ -45,18 +69,24 @@ def profile(request, username):
     context = {
         'posts': posts,
         'author': author,
-        'quantity': posts.count(),
+        'quantity': quantity,
         'page_obj': page_obj,
         'following': is_following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@conditional_feed(post_feeds)
+@cache_anonymous('post_page', post_feeds)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    resolve_thumbnails([post])
     form = CommentForm()
-    comments = post.comments.all()
-    quantity = post.author.posts.all().count()
+    comments = post.comments.all().select_related('author')
+    quantity = get_user_stats(post.author).posts_count
     context = {
         'post': post,
         'form': form,
@@ -66,7 +96,36 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_from_replica
+def search(request):
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    posts, next_cursor = search_posts(
+        query, group, author,
+        after=decode_search_cursor(request.GET.get('after', '')),
+    )
+    resolve_thumbnails(posts)
+    next_query = None
+    if next_cursor is not None:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'posts': posts,
+        'next_query': next_query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -76,6 +135,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        queue_thumbnails(post)
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -84,6 +144,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -95,6 +156,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post_id': post_id,
@@ -105,6 +168,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -116,18 +180,24 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginator(posts, request)
+    entries = TimelineEntry.objects.filter(
+        user=request.user
+    ).select_related('post__author', 'post__group')
+    page_obj = get_paginator(entries, request)
+    page_obj.object_list = [entry.post for entry in page_obj]
+    resolve_thumbnails(page_obj)
     context = {
-        'posts': posts,
+        'posts': page_obj.object_list,
         'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user == author:
@@ -140,6 +210,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     subscribe = get_object_or_404(Follow, user=request.user, author=author)
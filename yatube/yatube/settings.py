@@ -29,6 +29,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.routers.PinPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.CaptureProfileMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -64,9 +68,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
+# Реплики только для чтения лент: пути к копиям базы через запятую.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=10))
+
+# Прагмы для каждого нового соединения с SQLite: WAL не дает
+# записи блокировать чтение, busy_timeout (мс) ждет блокировку
+# вместо ошибки database is locked, cache_size < 0 — размер в КиБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', default=5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', default=256 * 2 ** 20)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', default=-64000)),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', default='MEMORY'),
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -115,6 +147,74 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'MAX_ENTRIES': 1000,
+            'CHECK_INTERVAL': 1,
+            'L1_TIMEOUT': 60,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', default=os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
+# Потоки, создающие миниатюры изображений постов после публикации;
+# 0 — создавать в потоке запроса.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', default='False') == 'True'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default=500))
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', default=100))
+SLOW_LOG_FILE = os.getenv('SLOW_LOG_FILE', default=os.path.join(BASE_DIR, 'slow.log'))
+
+# Снимки cProfile: по заголовку X-Profile или ?_profile для сотрудников
+# и случайная доля всех запросов. Хранятся последние PROFILE_CAPTURE_KEEP.
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', default=0))
+PROFILE_CAPTURE_DIR = os.getenv('PROFILE_CAPTURE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILE_CAPTURE_KEEP = int(os.getenv('PROFILE_CAPTURE_KEEP', default=50))
+
+# Метрики /metrics: каждый процесс пишет свой файл в METRICS_DIR
+# раз в METRICS_FLUSH_SECONDS, страница суммирует все файлы. Файлы,
+# не обновлявшиеся METRICS_STALE_SECONDS, переносятся в общий архив.
+METRICS_DIR = os.getenv('METRICS_DIR', default=os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', default=1))
+METRICS_STALE_SECONDS = float(os.getenv('METRICS_STALE_SECONDS', default=60))
+# Страницу /metrics отдают только адресам METRICS_ALLOWED_IPS или
+# запросам с заголовком Authorization: Bearer METRICS_TOKEN.
+METRICS_ALLOWED_IPS = str(os.getenv('METRICS_ALLOWED_IPS', default='127.0.0.1,::1')).split(',')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow': {
+            'format': '%(asctime)s %(message)s',
+        },
+    },
+    'handlers': {
+        'slow_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'slow',
+        },
+    },
+    'loggers': {
+        'yatube.slow': {
+            'handlers': ['slow_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
@@ -0,0 +1,26 @@
+"""Настройки тестов: manage.py test --settings=yatube.test_settings
+и pytest (pytest.ini). Тесты не трогают общий кеш и каталоги
+с данными рабочего экземпляра.
+"""
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES
+
+
+CACHES = {
+    **CACHES,
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
+# Фоновый поток писал бы миниатюры во временный MEDIA_ROOT,
+# пока тест его удаляет.
+THUMBNAIL_WORKERS = 0
+
+METRICS_DIR = tempfile.mkdtemp(prefix='yatube-metrics-')
+atexit.register(shutil.rmtree, METRICS_DIR, True)